@@ -1,7 +1,8 @@
 from abc import ABC
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List
+from pathlib import Path
+from typing import Optional, List, Union, BinaryIO
 
 from telegram import Message
 
@@ -20,10 +21,22 @@ class TextReplyContent(ReplyContent):
     text: str
 
 
+@dataclass(frozen=True)
+class FileDocument:
+    path: Path
+    size: int
+    mtime_ns: int
+    content_hash: Optional[str] = None
+    content: Optional[bytes] = field(default=None, compare=False, repr=False)
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb")
+
+
 @dataclass
 class DocumentReplyContent(ReplyContent):
     filename: str
-    document: bytes
+    document: Union[bytes, FileDocument]
 
 
 class Action(ABC):
@@ -49,3 +62,7 @@ class CompositeAction(Action):
 
     def __init__(self, actions: List[Optional[Action]]):
         self.actions = [action for action in actions if action]
+
+
+class SequentialAction(CompositeAction):
+    pass
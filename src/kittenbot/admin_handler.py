@@ -1,24 +1,27 @@
 import re
 from datetime import timedelta, datetime
-from typing import Any, Optional, List, Dict, Callable
+from typing import Any, Optional, List, Dict, Callable, Union
 
-from attr import define
+from attr import define, field
 from dateutil.relativedelta import relativedelta
 from loguru import logger
 from telegram import Update
 
 from .actions import Action, Reply, TextReplyContent
+from .awaitables import call_repo
 from .clock import Clock
-from .history import History
+from .history import History, AsyncHistory
 from .message_handler import KittenMessageHandler
-from .slowmode_user_repository import SlowmodeUserRepository
+from .resources import ResourceCatalog
+from .slowmode_user_repository import SlowmodeUserRepository, AsyncSlowmodeUserRepository
+from .stats import StatsRegistry
 from .types import HandlerFunc
 
 
-def get_user_id_handler(hist: History) -> HandlerFunc:
-    def _handle(update: Update, context: Any) -> Optional[Action]:
+def get_user_id_handler(hist: Union[History, AsyncHistory]) -> HandlerFunc:
+    async def _handle(update: Update, context: Any) -> Optional[Action]:
         username = update.message.text.split(" ", maxsplit=1)[1].strip().lstrip("@")
-        user_id = hist.get_user_id(username)
+        user_id = await call_repo(hist.get_user_id, username)
         if user_id:
             if len(user_id) == 1:
                 user_id = user_id[0]
@@ -42,25 +45,49 @@ def demo_handler(message_handler: KittenMessageHandler) -> HandlerFunc:
     return _handle
 
 
+def reload_resources_handler(catalog: ResourceCatalog) -> HandlerFunc:
+    def _handle(update: Update, context: Any) -> Optional[Action]:
+        count = catalog.load()
+        return Reply(update.message, TextReplyContent(f"reloaded {count} resources"))
+    return _handle
+
+
+def stats_handler(registry: StatsRegistry) -> HandlerFunc:
+    def _handle(update: Update, context: Any) -> Optional[Action]:
+        text = "\n".join(
+            f"{name}: " + ", ".join(f"{key}={_format_stat(value)}" for key, value in values.items())
+            for name, values in registry.collect().items()
+        )
+        return Reply(update.message, TextReplyContent(text or "no stats registered"))
+    return _handle
+
+
+def _format_stat(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
 @define
 class SlowCommandHandler:
-    repository: SlowmodeUserRepository
-    hist: History
+    repository: Union[SlowmodeUserRepository, AsyncSlowmodeUserRepository]
+    hist: Union[History, AsyncHistory]
     clock: Clock
 
-    def __call__(self, update: Update, context: Any) -> Optional[Action]:
-        return self.handle(update, context)
+    async def __call__(self, update: Update, context: Any) -> Optional[Action]:
+        return await self.handle(update, context)
 
-    def handle(self, update: Update, context: Any) -> Optional[Action]:
+    async def handle(self, update: Update, context: Any) -> Optional[Action]:
         command_args = update.message.text.split(" ")[1:]
         subcommand = command_args[0]
         parsed_args = self._parse_args(command_args[1:])
         logger.debug("parsed args for slow command: {parsed_args}", parsed_args=parsed_args)
-        username = self.hist.get_user_name(parsed_args.user_id)
+        username = await call_repo(self.hist.get_user_name, parsed_args.user_id)
         match subcommand:
             case "create":
                 logger.info("creating restriction")
-                self.repository.create_restriction(
+                await call_repo(
+                    self.repository.create_restriction,
                     chat_id=parsed_args.chat_id,
                     user_id=parsed_args.user_id,
                     interval=parsed_args.interval,
@@ -76,7 +103,8 @@ class SlowCommandHandler:
                 )
                 return Reply(update.message, reply_content)
             case "get":
-                restriction = self.repository.get_active_restriction(
+                restriction = await call_repo(
+                    self.repository.get_active_restriction,
                     chat_id=parsed_args.chat_id,
                     user_id=parsed_args.user_id
                 )
@@ -91,11 +119,14 @@ class SlowCommandHandler:
                     reply_text = f"user @{username} is not slowed"
                 return Reply(update.message, TextReplyContent(reply_text))
             case "update":
-                restriction = self.repository.update_restriction(
+                restriction = await call_repo(
+                    self.repository.update_restriction,
                     chat_id=parsed_args.chat_id,
                     user_id=parsed_args.user_id,
                     interval=parsed_args.interval
                 )
+                if not restriction:
+                    return Reply(update.message, TextReplyContent(f"user @{username} is not slowed"))
                 reply_text = _format_restriction(
                     parsed_args.user_id,
                     username,
@@ -104,7 +135,8 @@ class SlowCommandHandler:
                 )
                 return Reply(update.message, TextReplyContent(reply_text))
             case "delete":
-                self.repository.delete_restriction(
+                await call_repo(
+                    self.repository.delete_restriction,
                     chat_id=parsed_args.chat_id,
                     user_id=parsed_args.user_id
                 )
@@ -149,10 +181,10 @@ def _format_restriction(user_id: int, username: Optional[str], interval: timedel
 
 @define
 class SlowCommandArgs:
-    chat_id: int
-    user_id: int
-    interval: Optional[timedelta]
-    until_date: Optional[datetime]
+    chat_id: int = field(converter=int)
+    user_id: int = field(converter=int)
+    interval: Optional[timedelta] = None
+    until_date: Optional[datetime] = None
 
 
 _INTERVAL_PATTERN = re.compile(r"(?P<amount>[1-9][0-9]*)(?P<unit>\w+)", re.IGNORECASE | re.UNICODE)
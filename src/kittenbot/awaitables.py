@@ -0,0 +1,18 @@
+import asyncio
+import inspect
+from typing import TypeVar, Union, Awaitable, Callable, Any
+
+T = TypeVar("T")
+MaybeAwaitable = Union[T, Awaitable[T]]
+
+
+async def resolve(value: MaybeAwaitable[T]) -> T:
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def call_repo(fn: Callable[..., MaybeAwaitable[T]], *args: Any, **kwargs: Any) -> T:
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args, **kwargs)
+    return await asyncio.to_thread(fn, *args, **kwargs)
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from sys import stderr
+from typing import Dict, List, Any, Iterator
+
+import sqlalchemy
+from attr import define, field
+from loguru import logger
+from pymorphy3 import MorphAnalyzer
+from telegram import Bot, Update
+
+from . import entities
+from .actions import Action, Reply, DocumentReplyContent, FileDocument, CompositeAction
+from .awaitables import resolve
+from .clock import ProdClock
+from .config import BotConfig
+from .history import History
+from .history_writer import BufferedHistoryWriter
+from .language_processing import Nlp
+from .message_handler import KittenMessageHandler
+from .permissions import allow_all, SecurityFunc
+from .pipelines import pipeline, slowmode_support
+from .random_generator import RandomGenerator
+from .resources import ProdResources
+from .send_scheduler import Priority
+from .slowmode_user_repository import SlowmodeUserRepository, RestrictionIndex
+from .types import HandlerFunc
+
+STAGES = ["security", "handler", "slowmode_lookup", "action_build", "history_store", "total"]
+
+SYNTHETIC_TEXTS = [
+    "котобот, скинь котика",
+    "купил сегодня новый велосипед",
+    "кто будет пиццу для котиков",
+    "котобот извинись",
+    "надо помыть посуду и погладить кота",
+    "завтра поедем на дачу копать картошку",
+    "читаю книгу про космос",
+    "ты опять всё сломал",
+    "посмотрел вчера фильм, очень понравился",
+    "ладно",
+]
+
+BOT_USER_ID = 1
+
+
+@define
+class StageTimer:
+    samples: Dict[str, List[float]] = field(factory=lambda: defaultdict(list))
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - started)
+
+    def timed_security(self, security: SecurityFunc) -> SecurityFunc:
+        def wrapped(update, context):
+            with self.measure("security"):
+                return security(update, context)
+        return wrapped
+
+    def timed_handler(self, handler: HandlerFunc) -> HandlerFunc:
+        async def wrapped(update, context):
+            with self.measure("handler"):
+                return await resolve(handler(update, context))
+        return wrapped
+
+
+@define
+class TimedSlowmodeRepository:
+    repository: SlowmodeUserRepository
+    timer: StageTimer
+
+    def get_active_restriction(self, chat_id: int, user_id: int):
+        with self.timer.measure("slowmode_lookup"):
+            return self.repository.get_active_restriction(chat_id, user_id)
+
+
+@define
+class RecordingInterpreter:
+    timer: StageTimer
+    actions: List[Action] = field(factory=list)
+
+    async def run_action(self, action: Action, priority: int = Priority.NORMAL) -> None:
+        with self.timer.measure("action_build"):
+            self._build(action)
+        self.actions.append(action)
+
+    def _build(self, action: Action) -> None:
+        match action:
+            case Reply(_, DocumentReplyContent(_, FileDocument(content=None) as document)):
+                with document.open() as f:
+                    f.read()
+            case CompositeAction(parts):
+                for part in parts:
+                    self._build(part)
+
+
+def load_corpus(corpus_dir: Path) -> List[Dict[str, Any]]:
+    updates = []
+    for path in sorted(corpus_dir.glob("*.json")):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        updates.extend(data if isinstance(data, list) else [data])
+    return updates
+
+
+def synthetic_corpus(count: int, chats: int, users: int, seed: int) -> List[Dict[str, Any]]:
+    rand = random.Random(seed)
+    now = int(time.time())
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = rand.randint(100, 100 + users - 1)
+        message = {
+            "message_id": update_id,
+            "date": now,
+            "chat": {"id": -rand.randint(1, chats), "type": "supergroup", "title": "benchmark"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user", "username": f"user{user_id}"},
+            "text": rand.choice(SYNTHETIC_TEXTS),
+        }
+        if rand.random() < 0.1:
+            message["reply_to_message"] = {
+                "message_id": update_id - 1,
+                "date": now,
+                "chat": message["chat"],
+                "from": {"id": BOT_USER_ID, "is_bot": True, "first_name": "kittenbot"},
+                "text": "купи себе котика",
+            }
+        updates.append({"update_id": update_id, "message": message})
+    return updates
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def format_report(timer: StageTimer, count: int, elapsed: float) -> str:
+    lines = [
+        f"updates: {count}, elapsed: {elapsed:.3f}s, throughput: {count / elapsed:.1f} msgs/sec",
+        f"{'stage':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for stage in STAGES:
+        samples = timer.samples.get(stage)
+        if not samples:
+            continue
+        lines.append(
+            f"{stage:<16}{len(samples):>8}"
+            + "".join(f"{percentile(samples, fraction) * 1000:>10.3f}" for fraction in (.5, .95, .99, 1.))
+        )
+    return "\n".join(lines)
+
+
+async def run_benchmark(
+        updates: List[Dict[str, Any]],
+        config: BotConfig,
+        resources_dir: str,
+        db_path: Path,
+        slowed_users: int,
+        flush_batch_size: int
+) -> str:
+    engine = sqlalchemy.create_engine(f"sqlite:///{db_path}")
+    entities.Base.metadata.create_all(engine)
+    clock = ProdClock()
+    timer = StageTimer()
+
+    repository = SlowmodeUserRepository(engine, clock, RestrictionIndex())
+    user_ids = sorted({update["message"]["from"]["id"] for update in updates if "message" in update})
+    chat_ids = sorted({update["message"]["chat"]["id"] for update in updates if "message" in update})
+    for user_id in user_ids[:slowed_users]:
+        for chat_id in chat_ids:
+            repository.create_restriction(chat_id, user_id, timedelta(minutes=1))
+    repository.load_active_restrictions()
+
+    history = History(engine)
+    writer = BufferedHistoryWriter(history, flush_interval=3600., max_batch_size=flush_batch_size)
+    message_handler = KittenMessageHandler(
+        RandomGenerator(),
+        ProdResources(RandomGenerator(), resources_dir),
+        Nlp(MorphAnalyzer()),
+        BOT_USER_ID,
+        config.probability,
+        config.agree_probability,
+        config.test_group_ids,
+        config.bot_names or ["котобот"],
+        config.noun_template,
+        config.noun_weight,
+        config.verb_template,
+        config.verb_weight,
+        config.answer_by_name_probability,
+        config.reaction_stopwords,
+    )
+    interpreter = RecordingInterpreter(timer)
+    handle = pipeline(
+        timer.timed_security(allow_all),
+        slowmode_support(TimedSlowmodeRepository(repository, timer), clock)(timer.timed_handler(message_handler)),
+        interpreter,
+        Priority.LOW
+    )
+
+    bot = Bot("1:benchmark")
+    parsed = [Update.de_json(data, bot) for data in updates]
+    started = time.perf_counter()
+    for update in parsed:
+        with timer.measure("total"):
+            with timer.measure("history_store"):
+                if update.message:
+                    writer.submit_message(update.message)
+                if writer.pending_count >= flush_batch_size:
+                    await writer.flush()
+            await handle(update, None)
+    with timer.measure("history_store"):
+        await writer.flush()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return format_report(timer, len(parsed), elapsed) + f"\nactions: {len(interpreter.actions)}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m kittenbot.benchmark")
+    parser.add_argument("corpus", nargs="?", type=Path, help="directory with Update JSON files")
+    parser.add_argument("--synthetic", type=int, default=1000, help="number of synthetic updates without corpus")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--slowed-users", type=int, default=5)
+    parser.add_argument("--flush-batch-size", type=int, default=500)
+    parser.add_argument("--resources", default="resources")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(stderr, level="WARNING")
+    if args.corpus is not None:
+        updates = load_corpus(args.corpus)
+    else:
+        updates = synthetic_corpus(args.synthetic, args.chats, args.users, args.seed)
+    config = BotConfig(token="1:benchmark")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = asyncio.run(run_benchmark(
+            updates,
+            config,
+            args.resources,
+            Path(tmp_dir) / "benchmark.sqlite",
+            args.slowed_users,
+            args.flush_batch_size
+        ))
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
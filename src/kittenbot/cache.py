@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, TypeVar, Optional, Union, Callable
+
+K = TypeVar("K")
+V = TypeVar("V")
+D = TypeVar("D")
+
+
+class LruCache(Generic[K, V]):
+    def __init__(self, max_size: int):
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def get(self, key: K, default: Optional[D] = None) -> Union[V, D, None]:
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[D] = None) -> Union[V, D, None]:
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def pop_matching(self, predicate: Callable[[K, V], bool]) -> int:
+        with self._lock:
+            matching = [key for key, value in self._items.items() if predicate(key, value)]
+            for key in matching:
+                del self._items[key]
+            return len(matching)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class ByteBudgetCache(Generic[K]):
+    def __init__(self, max_bytes: int):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be a positive integer")
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: OrderedDict[K, bytes] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def get(self, key: K) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key: K, value: bytes) -> bool:
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous)
+            self._items[key] = value
+            self.size_bytes += len(value)
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                self.evictions += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.size_bytes = 0
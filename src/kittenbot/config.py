@@ -1,6 +1,6 @@
 import typing
 from string import Template
-from typing import List
+from typing import List, Optional
 
 from betterconf import field, Config
 from betterconf.caster import AbstractCaster, to_list, to_float, to_int
@@ -38,3 +38,53 @@ class BotConfig(Config):
     verb_weight: float = field("verb_weight", default=1., caster=to_float)
     answer_by_name_probability: float = field("answer_by_name_probability", default=0.5, caster=to_float)
     reaction_stopwords: List[str] = field("reaction_stopwords", default=["есть"], caster=to_list)
+    history_flush_interval: float = field("history_flush_interval", default=1., caster=to_float)
+    history_flush_batch_size: int = field("history_flush_batch_size", default=500, caster=to_int)
+    history_cache_size: int = field("history_cache_size", default=10000, caster=to_int)
+    user_lookup_cache_size: int = field("user_lookup_cache_size", default=10000, caster=to_int)
+    handler_pool_size: int = field("handler_pool_size", default=4, caster=to_int)
+    max_concurrent_updates: int = field("max_concurrent_updates", default=8, caster=to_int)
+    # a chat with this many queued updates drops further plain messages;
+    # commands and messages from slowed users are always queued so slowmode still applies
+    max_chat_queue_size: int = field("max_chat_queue_size", default=32, caster=to_int)
+    max_pending_updates: int = field("max_pending_updates", default=1024, caster=to_int)
+    slowmode_sweep_interval: float = field("slowmode_sweep_interval", default=3600., caster=to_float)
+    slowmode_sweep_batch_size: int = field("slowmode_sweep_batch_size", default=500, caster=to_int)
+    resources_refresh_interval: float = field("resources_refresh_interval", default=60., caster=to_float)
+    resource_cache_bytes: int = field("resource_cache_bytes", default=16 * 1024 * 1024, caster=to_int)
+    send_global_rate: float = field("send_global_rate", default=30., caster=to_float)
+    send_chat_rate: float = field("send_chat_rate", default=1., caster=to_float)
+    send_chat_burst: float = field("send_chat_burst", default=3., caster=to_float)
+    send_max_retries: int = field("send_max_retries", default=3, caster=to_int)
+    restriction_coalescer_size: int = field("restriction_coalescer_size", default=10000, caster=to_int)
+    http_connect_timeout: float = field("http_connect_timeout", default=5., caster=to_float)
+    api_pool_size: int = field("api_pool_size", default=16, caster=to_int)
+    api_read_timeout: float = field("api_read_timeout", default=5., caster=to_float)
+    api_write_timeout: float = field("api_write_timeout", default=5., caster=to_float)
+    api_pool_timeout: float = field("api_pool_timeout", default=1., caster=to_float)
+    api_http_version: str = field("api_http_version", default="1.1")
+    media_pool_size: int = field("media_pool_size", default=4, caster=to_int)
+    media_read_timeout: float = field("media_read_timeout", default=30., caster=to_float)
+    media_write_timeout: float = field("media_write_timeout", default=60., caster=to_float)
+    media_pool_timeout: float = field("media_pool_timeout", default=30., caster=to_float)
+    media_http_version: str = field("media_http_version", default="1.1")
+    get_updates_pool_size: int = field("get_updates_pool_size", default=1, caster=to_int)
+    get_updates_read_timeout: float = field("get_updates_read_timeout", default=5., caster=to_float)
+    get_updates_write_timeout: float = field("get_updates_write_timeout", default=5., caster=to_float)
+    get_updates_pool_timeout: float = field("get_updates_pool_timeout", default=1., caster=to_float)
+    get_updates_http_version: str = field("get_updates_http_version", default="1.1")
+    update_mode: str = field("update_mode", default="polling")
+    webhook_listen: str = field("webhook_listen", default="0.0.0.0")
+    webhook_port: int = field("webhook_port", default=8443, caster=to_int)
+    webhook_path: str = field("webhook_path", default="")
+    webhook_url: Optional[str] = field("webhook_url", default=None)
+    webhook_secret_token: Optional[str] = field("webhook_secret_token", default=None)
+    webhook_max_connections: int = field("webhook_max_connections", default=40, caster=to_int)
+    nlp_cache_size: int = field("nlp_cache_size", default=50000, caster=to_int)
+    nlp_inflection_cache_size: int = field("nlp_inflection_cache_size", default=10000, caster=to_int)
+    nlp_pool_size: int = field("nlp_pool_size", default=0, caster=to_int)
+    nlp_pool_timeout: float = field("nlp_pool_timeout", default=2., caster=to_float)
+    # only waiting messages that pass the reaction dice (or may hold a demo word) are prefetched;
+    # the roll is kept for the handler, so prefetch adds no parsing for messages the bot would ignore,
+    # but messages handled without waiting are never prefetched
+    nlp_prefetch_batch_size: int = field("nlp_prefetch_batch_size", default=0, caster=to_int)
@@ -1,5 +1,11 @@
+from typing import Union
+
 from alembic.config import Config
 from alembic import command
+from sqlalchemy import Engine, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+ASYNC_DRIVERS = ("aiosqlite", "asyncpg")
 
 
 def run_migrations(script_location: str, dsn: str) -> None:
@@ -7,3 +13,13 @@ def run_migrations(script_location: str, dsn: str) -> None:
     alembic_cfg.set_main_option('script_location', script_location)
     alembic_cfg.set_main_option('sqlalchemy.url', dsn)
     command.upgrade(alembic_cfg, 'head')
+
+
+def is_async_dsn(dsn: str) -> bool:
+    return make_url(dsn).get_driver_name() in ASYNC_DRIVERS
+
+
+def create_db_engine(dsn: str) -> Union[Engine, AsyncEngine]:
+    if is_async_dsn(dsn):
+        return create_async_engine(dsn)
+    return create_engine(dsn)
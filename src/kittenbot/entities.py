@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from typing import List, Optional
 
-from sqlalchemy import ForeignKey, Table, Column
+from sqlalchemy import ForeignKey, Table, Column, Index, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -32,6 +32,9 @@ class User(Base):
     chats: Mapped[List[Chat]] = relationship(secondary=chat_users, back_populates="users")
 
 
+Index("ix_user_username_lower", func.lower(User.username))
+
+
 class SlowmodeUser(Base):
     __tablename__ = "slowmode_user"
 
@@ -39,3 +42,10 @@ class SlowmodeUser(Base):
     chat_id: Mapped[int] = mapped_column(ForeignKey("chat.id"), primary_key=True)
     interval: Mapped[timedelta] = mapped_column()
     until_date: Mapped[Optional[datetime]] = mapped_column()
+
+
+class UploadedFile(Base):
+    __tablename__ = "uploaded_file"
+
+    content_hash: Mapped[str] = mapped_column(primary_key=True)
+    file_id: Mapped[str] = mapped_column()
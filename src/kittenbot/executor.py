@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter
+from typing import Callable, TypeVar, Any
+
+from attr import define
+
+T = TypeVar("T")
+
+
+@define
+class ExecutorStats:
+    max_workers: int
+    queue_depth: int
+    running: int
+    completed: int
+    average_wait: float
+    max_wait: float
+
+
+class HandlerExecutor:
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="handler")
+        self._lock = Lock()
+        self._queue_depth = 0
+        self._running = 0
+        self._completed = 0
+        self._total_wait = 0.
+        self._max_wait = 0.
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            self._queue_depth += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._call, perf_counter(), func, args)
+
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            started = self._running + self._completed
+            return ExecutorStats(
+                self.max_workers,
+                self._queue_depth,
+                self._running,
+                self._completed,
+                self._total_wait / started if started else 0.,
+                self._max_wait,
+            )
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _call(self, submitted_at: float, func: Callable[..., T], args: tuple) -> T:
+        wait = perf_counter() - submitted_at
+        with self._lock:
+            self._queue_depth -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
@@ -1,64 +1,289 @@
-from typing import Optional, List
+from typing import Optional, List, NamedTuple, Iterable, Set, Tuple, Dict, Callable
 
-from attr import define
+from attr import define, field
 from loguru import logger
-from sqlalchemy import Engine, select, exists, insert
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Engine, select, insert, Table, Insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
 from telegram import Message
 
 from . import entities
+from .cache import LruCache
+
+
+class HistoryEntry(NamedTuple):
+    chat_id: int
+    user_id: int
+    username: Optional[str]
+
+    @classmethod
+    def from_message(cls, message: Message) -> Optional["HistoryEntry"]:
+        if not message.from_user:
+            return None
+        return cls(message.chat_id, message.from_user.id, message.from_user.username)
+
+
+_UNKNOWN = object()
+
+_UPSERT_STATEMENTS: Dict[str, Callable[[Table], Insert]] = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
 
 
 @define
-class History:
-    engine: Engine
+class MembershipCache:
+    max_size: int
+    hits: int = field(init=False, default=0)
+    misses: int = field(init=False, default=0)
+    _known: LruCache = field(init=False)
 
-    def store(self, message: Message) -> None:
-        with Session(self.engine) as session:
-            chat = entities.Chat(id=message.chat_id)
-            is_new_chat = self._is_new_chat(session, message)
-            if is_new_chat:
-                logger.debug("adding new chat id {chat_id}", chat_id=chat.id)
-                session.add(chat)
-            user = self._get_user_by_id(session, message.from_user.id)
-            if not user:
-                user = entities.User(id=message.from_user.id, username=message.from_user.username)
-                logger.debug("adding new user id {user_id}", user_id=user.id)
-                session.add(user)
-
-            is_known_relation_user_to_chat = session.query(
-                exists(entities.chat_users)
-                .where(entities.chat_users.c.chat_id == chat.id
-                       and entities.chat_users.c.user_id == user.id)
+    @_known.default
+    def _create_known(self) -> LruCache:
+        return LruCache(self.max_size)
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def is_known(self, entry: HistoryEntry) -> bool:
+        if self._known.get((entry.chat_id, entry.user_id), _UNKNOWN) == entry.username:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def remember(self, entries: Iterable[HistoryEntry]) -> None:
+        for entry in entries:
+            self._known.put((entry.chat_id, entry.user_id), entry.username)
+
+
+@define
+class UserLookupCache:
+    max_size: int
+    _user_ids_by_username: LruCache = field(init=False)
+    _usernames_by_user_id: LruCache = field(init=False)
+
+    @_user_ids_by_username.default
+    def _create_user_ids_by_username(self) -> LruCache:
+        return LruCache(self.max_size)
+
+    @_usernames_by_user_id.default
+    def _create_usernames_by_user_id(self) -> LruCache:
+        return LruCache(self.max_size)
+
+    def get_user_ids(self, username: str) -> Optional[List[int]]:
+        user_ids = self._user_ids_by_username.get(username.lower())
+        return list(user_ids) if user_ids is not None else None
+
+    def put_user_ids(self, username: str, user_ids: List[int]) -> None:
+        self._user_ids_by_username.put(username.lower(), tuple(user_ids))
+
+    def get_username(self, user_id: int) -> object:
+        return self._usernames_by_user_id.get(user_id, _UNKNOWN)
+
+    def put_username(self, user_id: int, username: Optional[str]) -> None:
+        self._usernames_by_user_id.put(user_id, username)
+
+    def invalidate(self, entries: Iterable[HistoryEntry]) -> None:
+        user_ids = set()
+        for entry in entries:
+            user_ids.add(entry.user_id)
+            self._usernames_by_user_id.pop(entry.user_id)
+            if entry.username:
+                self._user_ids_by_username.pop(entry.username.lower())
+        self._user_ids_by_username.pop_matching(lambda _, cached_ids: not user_ids.isdisjoint(cached_ids))
+
+
+class _HistoryQueries:
+    membership_cache: Optional[MembershipCache]
+    lookup_cache: Optional[UserLookupCache]
+
+    def _filter_unknown(self, entries: Iterable[HistoryEntry]) -> List[HistoryEntry]:
+        if self.membership_cache is None:
+            return list(entries)
+        return [entry for entry in entries if not self.membership_cache.is_known(entry)]
+
+    def _remember(self, entries: List[HistoryEntry]) -> None:
+        if self.membership_cache is not None:
+            self.membership_cache.remember(entries)
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate(entries)
+
+    def _get_cached_user_ids(self, username: str) -> Optional[List[int]]:
+        if self.lookup_cache is None:
+            return None
+        return self.lookup_cache.get_user_ids(username)
+
+    def _cache_user_ids(self, username: str, user_ids: List[int]) -> List[int]:
+        if self.lookup_cache is not None:
+            self.lookup_cache.put_user_ids(username, user_ids)
+        return user_ids
+
+    def _get_cached_username(self, user_id: int) -> object:
+        if self.lookup_cache is None:
+            return _UNKNOWN
+        return self.lookup_cache.get_username(user_id)
+
+    def _cache_username(self, user_id: int, username: Optional[str]) -> Optional[str]:
+        if self.lookup_cache is not None:
+            self.lookup_cache.put_username(user_id, username)
+        return username
+
+    def _write(self, session: Session, entries: List[HistoryEntry]) -> None:
+        chat_ids = {entry.chat_id for entry in entries}
+        usernames = {entry.user_id: entry.username for entry in entries}
+        relations = {(entry.chat_id, entry.user_id) for entry in entries}
+        if upsert := _UPSERT_STATEMENTS.get(session.get_bind().dialect.name):
+            self._upsert(session, upsert, chat_ids, usernames, relations)
+        else:
+            self._insert_missing(session, chat_ids, usernames, relations)
+
+    def _select_user_ids(self, session: Session, username: str) -> List[int]:
+        statement = select(entities.User.id).where(func.lower(entities.User.username) == username.lower())
+        return list(session.execute(statement).scalars())
+
+    def _select_user_name(self, session: Session, user_id: int) -> Optional[str]:
+        statement = select(entities.User.username).where(entities.User.id == user_id)
+        return session.execute(statement).scalar()
+
+    def _upsert(
+            self,
+            session: Session,
+            upsert: Callable[[Table], Insert],
+            chat_ids: Set[int],
+            usernames: Dict[int, Optional[str]],
+            relations: Set[Tuple[int, int]]
+    ) -> None:
+        session.execute(
+            upsert(entities.Chat.__table__).on_conflict_do_nothing(index_elements=["id"]),
+            [{"id": chat_id} for chat_id in sorted(chat_ids)]
+        )
+        insert_users = upsert(entities.User.__table__)
+        session.execute(
+            insert_users.on_conflict_do_update(
+                index_elements=["id"],
+                set_={"username": insert_users.excluded.username},
+                where=entities.User.username.is_distinct_from(insert_users.excluded.username)
+            ),
+            [{"id": user_id, "username": username} for user_id, username in sorted(usernames.items())]
+        )
+        session.execute(
+            upsert(entities.chat_users).on_conflict_do_nothing(),
+            [{"chat_id": chat_id, "user_id": user_id} for chat_id, user_id in sorted(relations)]
+        )
+
+    def _insert_missing(
+            self,
+            session: Session,
+            chat_ids: Set[int],
+            usernames: Dict[int, Optional[str]],
+            relations: Set[Tuple[int, int]]
+    ) -> None:
+        for chat_id in chat_ids - self._get_known_chat_ids(session, chat_ids):
+            logger.debug("adding new chat id {chat_id}", chat_id=chat_id)
+            session.add(entities.Chat(id=chat_id))
+        for user_id in usernames.keys() - self._get_known_user_ids(session, usernames.keys()):
+            logger.debug("adding new user id {user_id}", user_id=user_id)
+            session.add(entities.User(id=user_id, username=usernames[user_id]))
+        session.flush()
+
+        new_relations = relations - self._get_known_relations(session, chat_ids, usernames.keys())
+        if new_relations:
+            session.execute(
+                insert(entities.chat_users),
+                [{"chat_id": chat_id, "user_id": user_id} for chat_id, user_id in new_relations]
             )
 
-            if not is_known_relation_user_to_chat:
-                session.execute(
-                    insert(entities.chat_users)
-                    .values(chat_id=chat.id, user_id=user.id)
-                )
+    def _get_known_chat_ids(self, session: Session, chat_ids: Iterable[int]) -> Set[int]:
+        return set(session.execute(
+            select(entities.Chat.id)
+            .where(entities.Chat.id.in_(chat_ids))
+        ).scalars())
+
+    def _get_known_user_ids(self, session: Session, user_ids: Iterable[int]) -> Set[int]:
+        return set(session.execute(
+            select(entities.User.id)
+            .where(entities.User.id.in_(user_ids))
+        ).scalars())
 
+    def _get_known_relations(
+            self,
+            session: Session,
+            chat_ids: Iterable[int],
+            user_ids: Iterable[int]
+    ) -> Set[Tuple[int, int]]:
+        return set(session.execute(
+            select(entities.chat_users.c.chat_id, entities.chat_users.c.user_id)
+            .where(entities.chat_users.c.chat_id.in_(chat_ids),
+                   entities.chat_users.c.user_id.in_(user_ids))
+        ).tuples())
+
+
+@define
+class History(_HistoryQueries):
+    engine: Engine
+    membership_cache: Optional[MembershipCache] = None
+    lookup_cache: Optional[UserLookupCache] = None
+
+    def store(self, message: Message) -> None:
+        if entry := HistoryEntry.from_message(message):
+            self.store_many([entry])
+
+    def store_many(self, entries: Iterable[HistoryEntry]) -> None:
+        entries = self._filter_unknown(entries)
+        if not entries:
+            return
+        with Session(self.engine) as session:
+            self._write(session, entries)
             session.commit()
+        self._remember(entries)
 
     def get_user_id(self, username: str) -> List[int]:
-        statement = select(entities.User.id).where(entities.User.username == username)
+        if (user_ids := self._get_cached_user_ids(username)) is not None:
+            return user_ids
         with Session(self.engine) as session:
-            return list(session.execute(statement).scalars())
+            return self._cache_user_ids(username, self._select_user_ids(session, username))
 
     def get_user_name(self, user_id: int) -> Optional[str]:
-        statement = select(entities.User.username).where(entities.User.id == user_id)
+        if (username := self._get_cached_username(user_id)) is not _UNKNOWN:
+            return username
         with Session(self.engine) as session:
-            return session.execute(statement).scalar()
-
-    def _is_new_chat(self, session: Session, message: Message) -> bool:
-        return not session.query(
-            exists(entities.Chat)
-            .where(entities.Chat.id == message.chat_id)
-        ).scalar()
-
-    def _get_user_by_id(self, session: Session, id_: int) -> Optional[entities.User]:
-        return session.execute(
-            select(entities.User)
-            .where(entities.User.id == id_)
-            .options(joinedload(entities.User.chats))
-        ).scalar()
+            return self._cache_username(user_id, self._select_user_name(session, user_id))
+
+
+@define
+class AsyncHistory(_HistoryQueries):
+    engine: AsyncEngine
+    membership_cache: Optional[MembershipCache] = None
+    lookup_cache: Optional[UserLookupCache] = None
+
+    async def store(self, message: Message) -> None:
+        if entry := HistoryEntry.from_message(message):
+            await self.store_many([entry])
+
+    async def store_many(self, entries: Iterable[HistoryEntry]) -> None:
+        entries = self._filter_unknown(entries)
+        if not entries:
+            return
+        async with AsyncSession(self.engine) as session:
+            await session.run_sync(self._write, entries)
+            await session.commit()
+        self._remember(entries)
+
+    async def get_user_id(self, username: str) -> List[int]:
+        if (user_ids := self._get_cached_user_ids(username)) is not None:
+            return user_ids
+        async with AsyncSession(self.engine) as session:
+            return self._cache_user_ids(username, await session.run_sync(self._select_user_ids, username))
+
+    async def get_user_name(self, user_id: int) -> Optional[str]:
+        if (username := self._get_cached_username(user_id)) is not _UNKNOWN:
+            return username
+        async with AsyncSession(self.engine) as session:
+            return self._cache_username(user_id, await session.run_sync(self._select_user_name, user_id))
@@ -0,0 +1,84 @@
+import asyncio
+from contextlib import suppress
+from typing import Dict, Tuple, Optional, List, Union
+
+from attr import define, field
+from loguru import logger
+from telegram import Message
+
+from .awaitables import call_repo
+from .history import History, HistoryEntry, AsyncHistory
+
+
+@define
+class BufferedHistoryWriter:
+    history: Union[History, AsyncHistory]
+    flush_interval: float
+    max_batch_size: int
+    _pending: Dict[Tuple[int, int], Optional[str]] = field(init=False, factory=dict)
+    _flush_requested: asyncio.Event = field(init=False, factory=asyncio.Event)
+    _flush_lock: asyncio.Lock = field(init=False, factory=asyncio.Lock)
+    _task: Optional[asyncio.Task] = field(init=False, default=None)
+    _stopping: bool = field(init=False, default=False)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def submit_message(self, message: Message) -> None:
+        if entry := HistoryEntry.from_message(message):
+            self.submit(entry)
+
+    def submit(self, entry: HistoryEntry) -> None:
+        key = (entry.chat_id, entry.user_id)
+        self._pending.pop(key, None)
+        self._pending[key] = entry.username
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_requested.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping = True
+            self._flush_requested.set()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            self._stopping = False
+        with logger.catch():
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            entries = self._take_pending()
+            try:
+                await call_repo(self.history.store_many, entries)
+            except BaseException:
+                self._restore_pending(entries)
+                raise
+            logger.debug("flushed {count} history entries", count=len(entries))
+            return len(entries)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            self._flush_requested.clear()
+            with logger.catch():
+                await self.flush()
+
+    def _take_pending(self) -> List[HistoryEntry]:
+        entries = [HistoryEntry(chat_id, user_id, username)
+                   for (chat_id, user_id), username in self._pending.items()]
+        self._pending = {}
+        return entries
+
+    def _restore_pending(self, entries: List[HistoryEntry]) -> None:
+        restored = {(entry.chat_id, entry.user_id): entry.username for entry in entries
+                    if (entry.chat_id, entry.user_id) not in self._pending}
+        self._pending = {**restored, **self._pending}
@@ -1,38 +1,162 @@
-from attr import define
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Optional, Union, Callable, Awaitable, TypeVar
+
+from attr import define, field
 from loguru import logger
-from telegram import Bot, ChatPermissions
+from telegram import Bot, ChatPermissions, Message
+from telegram.error import BadRequest
+
+from .actions import Action, Reply, DocumentReplyContent, TextReplyContent, RestrictMember, CompositeAction, \
+    FileDocument, SequentialAction
+from .awaitables import call_repo
+from .cache import LruCache
+from .restriction_coalescer import RestrictionCoalescer
+from .send_scheduler import SendScheduler, Priority
+from .uploaded_file_repository import UploadedFileRepository, AsyncUploadedFileRepository
 
-from .actions import Action, Reply, DocumentReplyContent, TextReplyContent, RestrictMember, CompositeAction
+T = TypeVar("T")
 
 
 @define
 class Interpreter:
     bot: Bot
+    uploaded_files: Optional[Union[UploadedFileRepository, AsyncUploadedFileRepository]] = None
+    scheduler: Optional[SendScheduler] = None
+    restrictions: Optional[RestrictionCoalescer] = None
+    media_bot: Optional[Bot] = None
+    _content_hashes: LruCache[FileDocument, str] = field(init=False, factory=lambda: LruCache(1024))
 
-    async def run_action(self, action: Action) -> None:
+    async def run_action(self, action: Action, priority: int = Priority.NORMAL) -> None:
         logger.debug("running action {action}", action=action)
         match action:
             case Reply(reply_to_message, content):
                 match content:
                     case DocumentReplyContent(filename, document):
-                        await self.bot.send_document(
-                            reply_to_message.chat_id,
-                            document=document,
-                            filename=filename,
-                            reply_to_message_id=reply_to_message.id)
+                        await self._send_document(
+                            reply_to_message.chat_id, reply_to_message.id, filename, document, priority)
                     case TextReplyContent(text):
-                        await self.bot.send_message(
+                        await self._call(reply_to_message.chat_id, priority, lambda: self.bot.send_message(
                             reply_to_message.chat_id,
                             text=text,
-                            reply_to_message_id=reply_to_message.id)
+                            reply_to_message_id=reply_to_message.id))
             case RestrictMember(chat_id, user_id, until_date):
-                await self.bot.restrict_chat_member(
-                    chat_id,
-                    user_id,
-                    ChatPermissions.no_permissions(),
-                    until_date)
-            case CompositeAction(parts):
+                await self._restrict(chat_id, user_id, until_date, priority)
+            case SequentialAction(parts):
                 for part in parts:
-                    await self.run_action(part)
+                    await self.run_action(part, priority)
+            case CompositeAction(parts):
+                results = await asyncio.gather(
+                    *(self.run_action(part, priority) for part in parts),
+                    return_exceptions=True)
+                errors = [result for result in results if isinstance(result, Exception)]
+                if errors:
+                    raise ExceptionGroup(f"{len(errors)} of {len(parts)} composite action parts failed", errors)
             case _:
                 logger.error("unknown action: {action}", action=action)
+
+    async def _restrict(self, chat_id: int, user_id: int, until_date: Optional[datetime], priority: int) -> None:
+        if self.restrictions is not None and not self.restrictions.try_acquire(chat_id, user_id, until_date):
+            logger.debug("user {user_id} is already restricted in chat {chat_id}", user_id=user_id, chat_id=chat_id)
+            return
+        try:
+            await self._call(chat_id, priority, lambda: self.bot.restrict_chat_member(
+                chat_id,
+                user_id,
+                ChatPermissions.no_permissions(),
+                until_date))
+        except Exception:
+            if self.restrictions is not None:
+                self.restrictions.release(chat_id, user_id)
+            raise
+
+    async def _call(self, chat_id: int, priority: int, call: Callable[[], Awaitable[T]]) -> T:
+        if self.scheduler is None:
+            return await call()
+        return await self.scheduler.submit(chat_id, call, priority)
+
+    async def _send_document(
+            self,
+            chat_id: int,
+            reply_to_message_id: int,
+            filename: str,
+            document: Union[bytes, FileDocument],
+            priority: int
+    ) -> None:
+        if self.uploaded_files is None:
+            await self._call(
+                chat_id, priority, lambda: self._upload_document(chat_id, reply_to_message_id, filename, document))
+            return
+
+        content_hash = await self._content_hash(document)
+        file_id = self.uploaded_files.get_file_id(content_hash)
+        if file_id is not None:
+            try:
+                await self._call(chat_id, priority, lambda: self.bot.send_document(
+                    chat_id,
+                    document=file_id,
+                    reply_to_message_id=reply_to_message_id))
+                return
+            except BadRequest as e:
+                if not _is_file_id_error(e):
+                    raise
+                logger.warning(
+                    "file id of {filename} was rejected, uploading it again: {error}",
+                    filename=filename,
+                    error=e.message)
+                await call_repo(self.uploaded_files.forget_file_id, content_hash)
+
+        message = await self._call(
+            chat_id, priority, lambda: self._upload_document(chat_id, reply_to_message_id, filename, document))
+        attachment = message.document or message.effective_attachment
+        if file_id := getattr(attachment, "file_id", None):
+            await call_repo(self.uploaded_files.save_file_id, content_hash, file_id)
+
+    async def _upload_document(
+            self,
+            chat_id: int,
+            reply_to_message_id: int,
+            filename: str,
+            document: Union[bytes, FileDocument]
+    ) -> Message:
+        bot = self.media_bot or self.bot
+        if isinstance(document, FileDocument):
+            if document.content is not None:
+                document = document.content
+            else:
+                document = await asyncio.to_thread(_read_file, document)
+        return await bot.send_document(
+            chat_id,
+            document=document,
+            filename=filename,
+            reply_to_message_id=reply_to_message_id)
+
+    async def _content_hash(self, document: Union[bytes, FileDocument]) -> str:
+        if not isinstance(document, FileDocument):
+            return hashlib.sha256(document).hexdigest()
+        if document.content_hash is not None:
+            return document.content_hash
+        content_hash = self._content_hashes.get(document)
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(_hash_file, document)
+            self._content_hashes.put(document, content_hash)
+        return content_hash
+
+
+def _is_file_id_error(error: BadRequest) -> bool:
+    message = error.message.lower()
+    return any(marker in message for marker in _FILE_ID_ERROR_MARKERS)
+
+
+_FILE_ID_ERROR_MARKERS = ("file identifier", "file_id", "file reference")
+
+
+def _read_file(document: FileDocument) -> bytes:
+    with document.open() as f:
+        return f.read()
+
+
+def _hash_file(document: FileDocument) -> str:
+    with document.open() as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
@@ -1,26 +1,88 @@
-from typing import Iterable, Optional
+from typing import Iterable, Optional, List, NamedTuple, Tuple, Callable, FrozenSet, Dict
 
-from attr import define
+from attr import define, field
 from pymorphy3 import MorphAnalyzer
 from pymorphy3.analyzer import Parse
 from pymorphy3.tokenizers import simple_word_tokenize
 
+from .cache import LruCache
+
+
+_MISSING = object()
+
+InflectionKey = Tuple[str, ...]
+
+
+class WordRecord(NamedTuple):
+    word: str
+    normal_form: str
+    pos: Optional[str]
+    tags: FrozenSet[str]
+    inflected: Optional[str]
+
+
+class AnalyzedText(NamedTuple):
+    nouns: List[WordRecord]
+    transitive_verbs: List[WordRecord]
+
 
 @define
 class Nlp:
     analyzer: MorphAnalyzer
+    cache_size: int = 10000
+    inflection_cache_size: int = 10000
+    parse_cache: Optional[LruCache[str, Parse]] = field(init=False)
+    inflection_cache: Optional[LruCache[InflectionKey, Optional[Parse]]] = field(init=False)
+
+    @parse_cache.default
+    def _create_parse_cache(self) -> Optional[LruCache[str, Parse]]:
+        return LruCache(self.cache_size) if self.cache_size else None
 
-    def get_nouns_from_str(self, text: str) -> Iterable[Parse]:
-        return filter(self.is_noun, self.parse_str(text))
+    @inflection_cache.default
+    def _create_inflection_cache(self) -> Optional[LruCache[InflectionKey, Optional[Parse]]]:
+        return LruCache(self.inflection_cache_size) if self.inflection_cache_size else None
 
-    def inflect_to_plur(self, word: Parse) -> Parse:
-        return word.inflect({"plur", "nomn"})
+    def analyze_text(self, text: str, inflect: bool = False) -> AnalyzedText:
+        return self.parse_many([text], inflect)[0]
 
-    def get_transitive_verbs_from_str(self, text: str) -> Iterable[Parse]:
-        return filter(lambda w: self.is_verb(w) and self.is_transitive(w), self.parse_str(text))
+    def parse_many(self, texts: Iterable[str], inflect: bool = False) -> List[AnalyzedText]:
+        tokenized = [self.tokenize(text) for text in texts]
+        words: Dict[str, Tuple[bool, WordRecord]] = {}
+        for token in dict.fromkeys(token.lower() for tokens in tokenized for token in tokens):
+            word = self.parse_word(token)
+            if self.is_noun(word) or (self.is_verb(word) and self.is_transitive(word)):
+                words[token] = (self.is_noun(word), _to_record(word, self._inflect(word) if inflect else None))
+        analyzed = []
+        for tokens in tokenized:
+            found = [words[token.lower()] for token in tokens if token.lower() in words]
+            analyzed.append(AnalyzedText(
+                [record for is_noun, record in found if is_noun],
+                [record for is_noun, record in found if not is_noun]
+            ))
+        return analyzed
 
-    def parse_str(self, text: str) -> Iterable[Parse]:
-        return map(lambda w: self.analyzer.parse(w)[0], simple_word_tokenize(text))
+    def inflect(self, word: WordRecord) -> Optional[str]:
+        if word.inflected is not None:
+            return word.inflected
+        return self._inflect(self.parse_word(word.word))
+
+    def parse_word(self, word: str) -> Parse:
+        if self.parse_cache is None:
+            return self.analyzer.parse(word)[0]
+        key = word.lower()
+        parsed = self.parse_cache.get(key)
+        if parsed is None:
+            parsed = self.analyzer.parse(key)[0]
+            self.parse_cache.put(key, parsed)
+        return parsed
+
+    def inflect_to_plur(self, word: Parse) -> Optional[Parse]:
+        return self._inflect_cached(
+            ("plur", word.normal_form, str(word.tag)),
+            lambda: word.inflect({"plur", "nomn"}))
+
+    def tokenize(self, text: str) -> List[str]:
+        return simple_word_tokenize(text)
 
     def is_noun(self, word: Optional[Parse]) -> bool:
         if not word or not word.tag:
@@ -35,7 +97,25 @@ class Nlp:
     def is_transitive(self, word: Parse) -> bool:
         return "tran" in word.tag
 
-    def inflect_to_imperative(self, word: Parse) -> Parse:
+    def inflect_to_imperative(self, word: Parse) -> Optional[Parse]:
+        return self._inflect_cached(
+            ("impr", word.normal_form, str(word.tag), word.word),
+            lambda: self._inflect_to_imperative(word))
+
+    def _inflect(self, word: Parse) -> Optional[str]:
+        inflected = self.inflect_to_plur(word) if self.is_noun(word) else self.inflect_to_imperative(word)
+        return inflected.word if inflected else None
+
+    def _inflect_cached(self, key: InflectionKey, inflect: Callable[[], Optional[Parse]]) -> Optional[Parse]:
+        if self.inflection_cache is None:
+            return inflect()
+        inflected = self.inflection_cache.get(key, _MISSING)
+        if inflected is _MISSING:
+            inflected = inflect()
+            self.inflection_cache.put(key, inflected)
+        return inflected
+
+    def _inflect_to_imperative(self, word: Parse) -> Optional[Parse]:
         removable_prefixes = ["не"]
         word_prefixes = []
         w = word.word
@@ -50,6 +130,8 @@ class Nlp:
         if perf_form:
             return perf_form
         imperf_form = word.inflect({"impr", "sing", "excl"})
+        if not imperf_form:
+            return None
         guessed_perf = self.analyzer.parse("за" + imperf_form.word)
         if guessed_perf:
             guessed_perf = guessed_perf[0]
@@ -57,13 +139,23 @@ class Nlp:
             guessed_perf = None
         if guessed_perf and guessed_perf.is_known:
             return guessed_perf
-        return word.inflect({"impr", "sing", "excl"})
+        return imperf_form
+
+
+def _to_record(word: Parse, inflected: Optional[str]) -> WordRecord:
+    return WordRecord(
+        word.word,
+        word.normal_form,
+        str(word.tag.POS) if word.tag.POS else None,
+        frozenset(str(grammeme) for grammeme in word.tag.grammemes),
+        inflected
+    )
 
 
 def test_inflection():
     analyzer = MorphAnalyzer()
     nlp = Nlp(analyzer)
-    word = list(nlp.get_nouns_from_str("магазинах"))[0]
+    word = nlp.parse_word("магазинах")
     actual = nlp.inflect_to_plur(word).word
     expected = "магазины"
     assert actual == expected
@@ -1,27 +1,44 @@
+import asyncio
 from pathlib import Path
 from sys import stdout
 
 from loguru import logger
 from pymorphy3.analyzer import MorphAnalyzer
-from sqlalchemy import create_engine
-from telegram.ext import ApplicationBuilder, filters, CommandHandler, MessageHandler
+from sqlalchemy.ext.asyncio import AsyncEngine
+from telegram import Bot
+from telegram.ext import Application, ApplicationBuilder, filters, CommandHandler, MessageHandler
+from telegram.request import HTTPXRequest
 
-from .admin_handler import get_user_id_handler, SlowCommandHandler, demo_handler
+from .admin_handler import get_user_id_handler, SlowCommandHandler, demo_handler, stats_handler, \
+    reload_resources_handler
+from .awaitables import call_repo
+from .cache import ByteBudgetCache
 from .clock import ProdClock
 from .config import BotConfig
-from .db import run_migrations
-from .history import History
+from .db import run_migrations, create_db_engine
+from .executor import HandlerExecutor
+from .history import History, MembershipCache, AsyncHistory, UserLookupCache
+from .history_writer import BufferedHistoryWriter
 from .interpreter import Interpreter
 from .language_processing import Nlp
 from .message_handler import KittenMessageHandler
 from .middleware import StoringUpdateProcessorWrapper
+from .nlp_pool import NlpPool
+from .nlp_prefetch import NlpPrefetcher
 from .permissions import allow_all, whitelist
 from .ping_handler import ping
-from .pipelines import pipeline, slowmode_support
+from .periodic import PeriodicTask
+from .pipelines import pipeline, slowmode_support, blocking
 from .random_generator import RandomGenerator
 from .resources import ProdResources
-from .slowmode_user_repository import SlowmodeUserRepository
+from .restriction_coalescer import RestrictionCoalescer
+from .slowmode_user_repository import SlowmodeUserRepository, AsyncSlowmodeUserRepository, RestrictionIndex
+from .send_scheduler import SendScheduler, Priority
+from .stats import StatsRegistry
+from .sweeper import RestrictionSweeper
+from .uploaded_file_repository import UploadedFileRepository, AsyncUploadedFileRepository
 from .util_handlers import parse_handler, inflect_handler
+from .webhook import run_application, validate_update_mode
 
 
 def main():
@@ -33,20 +50,40 @@ def main():
     if config.token is None:
         logger.error("token is not set, exit")
         exit(1)
+    validate_update_mode(config)
 
     migrations_path = str(Path(__file__).parent / "migrations")
     run_migrations(migrations_path, config.db_connection_string)
 
-    engine = create_engine(config.db_connection_string)
-    hist = History(engine)
+    engine = create_db_engine(config.db_connection_string)
+    clock = ProdClock()
+    membership_cache = MembershipCache(config.history_cache_size) if config.history_cache_size else None
+    lookup_cache = UserLookupCache(config.user_lookup_cache_size) if config.user_lookup_cache_size else None
+    restriction_index = RestrictionIndex()
+    if isinstance(engine, AsyncEngine):
+        hist = AsyncHistory(engine, membership_cache, lookup_cache)
+        slowmode_user_repository = AsyncSlowmodeUserRepository(engine, clock, restriction_index)
+        uploaded_files = AsyncUploadedFileRepository(engine)
+    else:
+        hist = History(engine, membership_cache, lookup_cache)
+        slowmode_user_repository = SlowmodeUserRepository(engine, clock, restriction_index)
+        uploaded_files = UploadedFileRepository(engine)
+    history_writer = BufferedHistoryWriter(hist, config.history_flush_interval, config.history_flush_batch_size)
     rand_gen = RandomGenerator()
-    resources = ProdResources(rand_gen, "resources")
+    resource_cache = ByteBudgetCache(config.resource_cache_bytes) if config.resource_cache_bytes else None
+    resources = ProdResources(rand_gen, "resources", resource_cache)
     self_user_id = int(config.token.split(":")[0])
     morph_analyzer = MorphAnalyzer()
+    nlp = Nlp(morph_analyzer, config.nlp_cache_size, config.nlp_inflection_cache_size)
+    nlp_pool = NlpPool(nlp, config.nlp_pool_size, config.nlp_pool_timeout) if config.nlp_pool_size else None
+    nlp_prefetcher = NlpPrefetcher(
+        nlp_pool or nlp,
+        config.nlp_prefetch_batch_size
+    ) if config.nlp_prefetch_batch_size else None
     message_handler = KittenMessageHandler(
         rand_gen,
         resources,
-        Nlp(morph_analyzer),
+        nlp_prefetcher or nlp_pool or nlp,
         self_user_id,
         config.probability,
         config.agree_probability,
@@ -59,27 +96,194 @@ def main():
         config.answer_by_name_probability,
         config.reaction_stopwords,
     )
+    if nlp_prefetcher is not None:
+        nlp_prefetcher.gate = message_handler.wants_analysis
+
+    update_processor = StoringUpdateProcessorWrapper(
+        history_writer,
+        config.max_concurrent_updates,
+        config.max_chat_queue_size,
+        config.max_pending_updates,
+        nlp_prefetcher,
+        restriction_index,
+        clock
+    )
+    scheduler = SendScheduler(
+        config.send_global_rate,
+        config.send_chat_rate,
+        config.send_chat_burst,
+        config.send_max_retries
+    ) if config.send_global_rate else None
+    sweeper = RestrictionSweeper(slowmode_user_repository, config.slowmode_sweep_batch_size)
+    periodic_tasks = [
+        PeriodicTask("slowmode_sweeper", config.slowmode_sweep_interval, sweeper.sweep),
+    ]
+    if config.resources_refresh_interval:
+        async def refresh_resources() -> None:
+            await asyncio.to_thread(resources.catalog.refresh_if_changed)
+        periodic_tasks.append(PeriodicTask("resources_refresh", config.resources_refresh_interval, refresh_resources))
+
+    media_bot = Bot(config.token, request=create_media_request(config))
+
+    async def post_init(application: Application) -> None:
+        await media_bot.initialize()
+        restrictions_count = await call_repo(slowmode_user_repository.load_active_restrictions)
+        logger.info("loaded {count} active slowmode restrictions", count=restrictions_count)
+        file_ids_count = await call_repo(uploaded_files.load_file_ids)
+        logger.info("loaded {count} uploaded file ids", count=file_ids_count)
+        if scheduler is not None:
+            await scheduler.start()
+        for task in periodic_tasks:
+            await task.start()
+
+    async def post_shutdown(application: Application) -> None:
+        for task in periodic_tasks:
+            await task.stop()
+        if scheduler is not None:
+            await scheduler.stop()
+        await media_bot.shutdown()
 
     app = (ApplicationBuilder()
-           .concurrent_updates(StoringUpdateProcessorWrapper(hist))
+           .concurrent_updates(update_processor)
+           .post_init(post_init)
+           .post_shutdown(post_shutdown)
            .token(config.token)
+           .request(create_api_request(config))
+           .get_updates_request(create_get_updates_request(config))
            .build())
 
-    interpreter = Interpreter(app.bot)
+    restriction_coalescer = RestrictionCoalescer(clock, config.restriction_coalescer_size)
+    interpreter = Interpreter(app.bot, uploaded_files, scheduler, restriction_coalescer, media_bot)
     security = whitelist(config.admin_user_ids)
-    clock = ProdClock()
-    slowmode_user_repository = SlowmodeUserRepository(engine, clock)
     slow_handler = SlowCommandHandler(slowmode_user_repository, hist, clock)
+    executor = HandlerExecutor(config.handler_pool_size)
+    stats = StatsRegistry()
+    stats.register("handler_pool", executor.stats)
+    stats.register("update_processor", update_processor.stats)
+    stats.register("slowmode_index", lambda: {"restrictions": len(restriction_index)})
+    stats.register("uploaded_files", lambda: {"file_ids": len(uploaded_files)})
+    stats.register("restriction_coalescer", lambda: {
+        "tracked": len(restriction_coalescer),
+        "coalesced": restriction_coalescer.coalesced,
+    })
+    stats.register("slowmode_sweeper", lambda: {
+        "last_swept": sweeper.last_swept,
+        "total_swept": sweeper.total_swept,
+    })
+    if scheduler is not None:
+        stats.register("send_scheduler", scheduler.stats)
+    if resource_cache is not None:
+        stats.register("resource_cache", lambda: {
+            "size": len(resource_cache),
+            "bytes": resource_cache.size_bytes,
+            "max_bytes": resource_cache.max_bytes,
+            "hits": resource_cache.hits,
+            "misses": resource_cache.misses,
+            "evictions": resource_cache.evictions,
+        })
+    if nlp_pool is not None:
+        stats.register("nlp_pool", nlp_pool.stats)
+    if nlp_prefetcher is not None:
+        stats.register("nlp_prefetch", nlp_prefetcher.stats)
+    if nlp.parse_cache is not None:
+        stats.register("nlp_parse_cache", lambda: {
+            "size": len(nlp.parse_cache),
+            "hits": nlp.parse_cache.hits,
+            "misses": nlp.parse_cache.misses,
+            "hit_rate": nlp.parse_cache.hit_rate,
+        })
+    if nlp.inflection_cache is not None:
+        stats.register("nlp_inflection_cache", lambda: {
+            "size": len(nlp.inflection_cache),
+            "hits": nlp.inflection_cache.hits,
+            "misses": nlp.inflection_cache.misses,
+            "hit_rate": nlp.inflection_cache.hit_rate,
+        })
+    if membership_cache is not None:
+        stats.register("membership_cache", lambda: {
+            "size": len(membership_cache),
+            "hits": membership_cache.hits,
+            "misses": membership_cache.misses,
+        })
+    nlp_handler = blocking(executor) if nlp_pool is None else lambda handler: handler
     app.add_handlers([
         CommandHandler("ping", pipeline(allow_all, ping, interpreter)),
-        CommandHandler("get_user_id", pipeline(security, get_user_id_handler(hist), interpreter)),
-        CommandHandler("slow", pipeline(security, slow_handler, interpreter)),
-        CommandHandler("demo", pipeline(security, demo_handler(message_handler), interpreter)),
-        CommandHandler("parse", pipeline(allow_all, parse_handler(morph_analyzer), interpreter)),
-        CommandHandler("inflect", pipeline(allow_all, inflect_handler(morph_analyzer), interpreter)),
+        CommandHandler("get_user_id", pipeline(security, get_user_id_handler(hist), interpreter, Priority.HIGH)),
+        CommandHandler("slow", pipeline(security, slow_handler, interpreter, Priority.HIGH)),
+        CommandHandler("demo", pipeline(security, demo_handler(message_handler), interpreter, Priority.HIGH)),
+        CommandHandler("stats", pipeline(security, stats_handler(stats), interpreter, Priority.HIGH)),
+        CommandHandler(
+            "reload_resources",
+            pipeline(
+                security,
+                blocking(executor)(reload_resources_handler(resources.catalog)),
+                interpreter,
+                Priority.HIGH)),
+        CommandHandler("parse", pipeline(allow_all, nlp_handler(parse_handler(nlp, nlp_pool)), interpreter)),
+        CommandHandler("inflect", pipeline(allow_all, nlp_handler(inflect_handler(nlp, nlp_pool)), interpreter)),
         MessageHandler(
             ~filters.COMMAND,
-            pipeline(allow_all, slowmode_support(slowmode_user_repository, clock)(message_handler), interpreter)),
+            pipeline(
+                allow_all,
+                slowmode_support(slowmode_user_repository, clock)(blocking(executor)(message_handler)),
+                interpreter,
+                Priority.LOW)),
     ])
-    logger.info("bot is listening")
-    app.run_polling()
+    logger.info("bot is listening for updates via {mode}", mode=config.update_mode)
+    try:
+        run_application(app, config)
+    finally:
+        executor.shutdown()
+        if nlp_pool is not None:
+            nlp_pool.shutdown()
+
+
+def create_api_request(config: BotConfig) -> HTTPXRequest:
+    return _create_request(
+        config,
+        config.api_pool_size,
+        config.api_read_timeout,
+        config.api_write_timeout,
+        config.api_pool_timeout,
+        config.api_http_version
+    )
+
+
+def create_media_request(config: BotConfig) -> HTTPXRequest:
+    return _create_request(
+        config,
+        config.media_pool_size,
+        config.media_read_timeout,
+        config.media_write_timeout,
+        config.media_pool_timeout,
+        config.media_http_version
+    )
+
+
+def create_get_updates_request(config: BotConfig) -> HTTPXRequest:
+    return _create_request(
+        config,
+        config.get_updates_pool_size,
+        config.get_updates_read_timeout,
+        config.get_updates_write_timeout,
+        config.get_updates_pool_timeout,
+        config.get_updates_http_version
+    )
+
+
+def _create_request(
+        config: BotConfig,
+        pool_size: int,
+        read_timeout: float,
+        write_timeout: float,
+        pool_timeout: float,
+        http_version: str
+) -> HTTPXRequest:
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        connect_timeout=config.http_connect_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version
+    )
@@ -1,15 +1,18 @@
 import re
 from string import Template
-from typing import List, Optional
+from threading import Lock
+from typing import List, Optional, Tuple, Union
 
 from attr import define
 from loguru import logger
-from pymorphy3.analyzer import Parse
 from telegram import Update, Message
 from telegram.ext import ContextTypes
 
 from .actions import Action, Reply, TextReplyContent, DocumentReplyContent
-from .language_processing import Nlp
+from .cache import LruCache
+from .language_processing import Nlp, WordRecord
+from .nlp_pool import NlpPool
+from .nlp_prefetch import NlpPrefetcher
 from .random_generator import RandomGenerator
 from .resources import Resources
 
@@ -21,7 +24,7 @@ class KittenMessageHandler:
             self,
             random_generator: RandomGenerator,
             resources: Resources,
-            nlp: Nlp,
+            nlp: Union[Nlp, NlpPool, NlpPrefetcher],
             self_user_id: int,
             action_probability: float,
             agree_probability: float,
@@ -52,8 +55,10 @@ class KittenMessageHandler:
         self.verb_template = verb_template
         self.verb_weight = verb_weight
         self.demo_words = []
+        self._demo_words_lock = Lock()
         self.answer_by_name_probability = answer_by_name_probability
         self.reaction_stopwords = reaction_stopwords
+        self._reaction_rolls: LruCache[Tuple[int, int], bool] = LruCache(1024)
 
     def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Action]:
         return self.handle(update, context)
@@ -76,32 +81,48 @@ class KittenMessageHandler:
         else:
             return self.react_to_random_word(update)
 
+    def wants_analysis(self, update: Update) -> bool:
+        if update.message is None or update.message.text is None or update.message.message_thread_id:
+            return False
+        normalized_text = self._normalize_text(update.message.text)
+        if self._find_subj(normalized_text):
+            return False
+        if self._is_reply_to_bot_message(update) and "извинись" in normalized_text:
+            return False
+        if self._may_contain_demo_word(update.message.text):
+            return True
+        should_react = self._roll_reaction(update)
+        self._reaction_rolls.put(_message_key(update.message), should_react)
+        return should_react
+
     def reply_with_random_gif(self, message: Message, directory: str) -> Action:
         resource = self.resources.get_random_resource(directory)
-        return Reply(message, DocumentReplyContent(resource.name, resource.get_bytes()))
+        return Reply(message, DocumentReplyContent(resource.name, resource.get_document()))
 
     def react_to_random_word(self, update: Update) -> Optional[Action]:
         if update.message.message_thread_id:
             return None
-        nouns = [
-            w
-            for w in self.nlp.get_nouns_from_str(update.message.text)
-            if not re.search(self._bot_name_pattern, w.word) and w.word not in self.reaction_stopwords
-        ]
-        verbs = [
-            w
-            for w in self.nlp.get_transitive_verbs_from_str(update.message.text)
-            if w.word not in self.reaction_stopwords
-        ]
+        if self._may_contain_demo_word(update.message.text):
+            return self._react_to_demo_or_random_word(update)
+        if not self._should_react_to_message(update):
+            return None
+        nouns, verbs = self._find_reaction_words(update.message.text)
+        if not nouns and not verbs:
+            return None
+        return self._react_to_word(update, nouns, verbs)
+
+    def _react_to_demo_or_random_word(self, update: Update) -> Optional[Action]:
+        nouns, verbs = self._find_reaction_words(update.message.text)
         if not nouns and not verbs:
             return None
-        demo_word: Optional[Parse] = next(filter(lambda w: w.word in self.demo_words, nouns + verbs), None)
+        demo_word = self._take_demo_word(nouns + verbs)
         if demo_word:
-            reply_content = self._format_template(demo_word)
-            self.demo_words.remove(demo_word.word)
-            return Reply(update.message, TextReplyContent(reply_content))
+            return self._reply_with_word(update, demo_word)
         if not self._should_react_to_message(update):
             return None
+        return self._react_to_word(update, nouns, verbs)
+
+    def _react_to_word(self, update: Update, nouns: List[WordRecord], verbs: List[WordRecord]) -> Optional[Action]:
         if nouns and verbs:
             noun_chance = self.random_generator.get_int(1, 100) * self.noun_weight
             verb_chance = self.random_generator.get_int(1, 100) * self.verb_weight
@@ -113,11 +134,50 @@ class KittenMessageHandler:
             word = self.random_generator.choice(nouns)
         else:
             word = self.random_generator.choice(verbs)
-        reply_content = self._format_template(word)
+        return self._reply_with_word(update, word)
+
+    def _reply_with_word(self, update: Update, word: WordRecord) -> Optional[Action]:
+        inflected = self.nlp.inflect(word)
+        if inflected is None:
+            logger.warning(f"no inflection for word {word.word}")
+            return None
+        reply_content = self._format_template(word, inflected)
         logger.info(f"reacting with message {reply_content}")
         return Reply(update.message, TextReplyContent(reply_content))
 
+    def _find_reaction_words(self, text: str) -> Tuple[List[WordRecord], List[WordRecord]]:
+        parsed = self.nlp.analyze_text(text)
+        nouns = [
+            w
+            for w in parsed.nouns
+            if not re.search(self._bot_name_pattern, w.word) and w.word not in self.reaction_stopwords
+        ]
+        verbs = [
+            w
+            for w in parsed.transitive_verbs
+            if w.word not in self.reaction_stopwords
+        ]
+        return nouns, verbs
+
+    def _take_demo_word(self, words: List[WordRecord]) -> Optional[WordRecord]:
+        with self._demo_words_lock:
+            demo_word = next(filter(lambda w: w.word in self.demo_words, words), None)
+            if demo_word:
+                self.demo_words.remove(demo_word.word)
+            return demo_word
+
+    def _may_contain_demo_word(self, text: str) -> bool:
+        if not self.demo_words:
+            return False
+        return any(token.lower() in self.demo_words for token in self.nlp.tokenize(text))
+
     def _should_react_to_message(self, update: Update) -> bool:
+        rolled = self._reaction_rolls.pop(_message_key(update.message))
+        if rolled is not None:
+            return rolled
+        return self._roll_reaction(update)
+
+    def _roll_reaction(self, update: Update) -> bool:
         if update.message.chat.id in self.test_group_ids:
             return True
         if (re.search(self._bot_name_pattern, update.message.text.lower())
@@ -127,15 +187,14 @@ class KittenMessageHandler:
             return True
         return False
 
-    def _format_template(self, word: Parse) -> str:
-        if self.nlp.is_noun(word):
-            subj_inflected = self.nlp.inflect_to_plur(word).word
-            return self.noun_template.substitute(subj=subj_inflected)
-        verb_inflected = self.nlp.inflect_to_imperative(word).word
-        return self.verb_template.substitute(verb=verb_inflected)
+    def _format_template(self, word: WordRecord, inflected: str) -> str:
+        if word.pos == "NOUN":
+            return self.noun_template.substitute(subj=inflected)
+        return self.verb_template.substitute(verb=inflected)
 
     def add_demo_word(self, word: str) -> None:
-        self.demo_words.append(word)
+        with self._demo_words_lock:
+            self.demo_words.append(word)
 
     def _normalize_text(self, text: str) -> str:
         return text.lower()
@@ -150,3 +209,7 @@ class KittenMessageHandler:
         if not match:
             return None
         return match.group("subj")
+
+
+def _message_key(message: Message) -> Tuple[int, int]:
+    return message.chat.id, message.message_id
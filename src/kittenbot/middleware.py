@@ -1,24 +1,162 @@
-from typing import Awaitable, Any
+import asyncio
+from collections import deque
+from contextlib import suppress
+from typing import Awaitable, Any, Dict, Deque, Optional
 
+from loguru import logger
+from telegram import Update, MessageEntity
 from telegram.ext import BaseUpdateProcessor
 
-from .history import History
+from .clock import Clock, ProdClock
+from .history_writer import BufferedHistoryWriter
+from .nlp_prefetch import NlpPrefetcher
+from .slowmode_user_repository import RestrictionIndex
 
 
-class StoringUpdateProcessorWrapper(BaseUpdateProcessor):
-    def __init__(self, history: History):
-        super().__init__(1)
-        self.history = history
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(
+            self,
+            max_concurrent_updates: int,
+            max_chat_queue_size: int,
+            max_pending_updates: int = 1024,
+            prefetcher: Optional[NlpPrefetcher] = None,
+            restriction_index: Optional[RestrictionIndex] = None,
+            clock: Clock = ProdClock()
+    ):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.concurrency_limit = max_concurrent_updates
+        self.max_chat_queue_size = max_chat_queue_size
+        self.prefetcher = prefetcher
+        self.restriction_index = restriction_index
+        self.clock = clock
+        self.dropped_updates = 0
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_queues: Dict[int, Deque[asyncio.Future]] = {}
+        self._backlog: Dict[int, str] = {}
+        self._prefetch_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_updates(self) -> int:
+        return sum(len(queue) for queue in self._chat_queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active_chats": len(self._chat_queues),
+            "pending_updates": self.pending_updates,
+            "dropped_updates": self.dropped_updates,
+        }
 
     async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        chat_id = _get_chat_id(update)
+        if chat_id is None:
+            async with self._running:
+                await coroutine
+            return
+
+        queue = self._chat_queues.setdefault(chat_id, deque())
+        if len(queue) >= self.max_chat_queue_size and not self._must_process(update, chat_id):
+            self.dropped_updates += 1
+            logger.warning("update queue of chat {chat_id} is full, dropping update", chat_id=chat_id)
+            coroutine.close()
+            return
+
+        previous = queue[-1] if queue else None
+        done = asyncio.get_running_loop().create_future()
+        queue.append(done)
+        if previous is not None or self._running.locked():
+            self._add_to_backlog(update)
         try:
-            if update.message:
-                self.history.store(update.message)
+            if previous is not None:
+                await asyncio.shield(previous)
+            async with self._running:
+                self._backlog.pop(update.update_id, None)
+                await coroutine
         finally:
-            await coroutine
+            self._backlog.pop(update.update_id, None)
+            if not done.done():
+                done.set_result(None)
+            queue.remove(done)
+            if not queue:
+                del self._chat_queues[chat_id]
+
+    def _must_process(self, update: object, chat_id: int) -> bool:
+        if _is_command(update):
+            return True
+        if self.restriction_index is None or not isinstance(update, Update) or not update.effective_user:
+            return False
+        return self.restriction_index.get_active(chat_id, update.effective_user.id, self.clock.now()) is not None
+
+    def _add_to_backlog(self, update: Update) -> None:
+        if self.prefetcher is None or not update.message or not update.message.text:
+            return
+        if not self.prefetcher.accepts(update):
+            return
+        self._backlog[update.update_id] = update.message.text
+        if len(self._backlog) < self.prefetcher.min_batch_size:
+            return
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = asyncio.create_task(self._prefetch_backlog(), name="nlp_prefetch")
+
+    async def _prefetch_backlog(self) -> None:
+        while len(self._backlog) >= self.prefetcher.min_batch_size:
+            texts = list(self._backlog.values())
+            self._backlog.clear()
+            await self.prefetcher.prefetch(texts)
 
     async def initialize(self) -> None:
         pass
 
     async def shutdown(self) -> None:
-        pass
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._prefetch_task
+
+
+class StoringUpdateProcessorWrapper(ChatOrderedUpdateProcessor):
+    def __init__(
+            self,
+            history_writer: BufferedHistoryWriter,
+            max_concurrent_updates: int = 1,
+            max_chat_queue_size: int = 32,
+            max_pending_updates: int = 1024,
+            prefetcher: Optional[NlpPrefetcher] = None,
+            restriction_index: Optional[RestrictionIndex] = None,
+            clock: Clock = ProdClock()
+    ):
+        super().__init__(
+            max_concurrent_updates,
+            max_chat_queue_size,
+            max_pending_updates,
+            prefetcher,
+            restriction_index,
+            clock
+        )
+        self.history_writer = history_writer
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        try:
+            if update.message:
+                self.history_writer.submit_message(update.message)
+        finally:
+            await super().do_process_update(update, coroutine)
+
+    async def initialize(self) -> None:
+        await self.history_writer.start()
+
+    async def shutdown(self) -> None:
+        await super().shutdown()
+        await self.history_writer.stop()
+
+
+def _is_command(update: object) -> bool:
+    if not isinstance(update, Update) or not update.effective_message:
+        return False
+    entities = update.effective_message.entities
+    return bool(entities) and entities[0].type == MessageEntity.BOT_COMMAND and entities[0].offset == 0
+
+
+def _get_chat_id(update: object) -> Optional[int]:
+    if isinstance(update, Update) and update.effective_chat:
+        return update.effective_chat.id
+    return None
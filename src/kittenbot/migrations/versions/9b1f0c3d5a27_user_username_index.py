@@ -0,0 +1,24 @@
+"""user username index
+
+Revision ID: 9b1f0c3d5a27
+Revises: 4e742f730aa3
+Create Date: 2026-10-18 09:12:40.518311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f0c3d5a27'
+down_revision = '4e742f730aa3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_username_lower', table_name='user')
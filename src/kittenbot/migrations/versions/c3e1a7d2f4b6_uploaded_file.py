@@ -0,0 +1,28 @@
+"""uploaded file
+
+Revision ID: c3e1a7d2f4b6
+Revises: 9b1f0c3d5a27
+Create Date: 2026-10-18 11:02:17.804615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e1a7d2f4b6'
+down_revision = '9b1f0c3d5a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('uploaded_file',
+    sa.Column('content_hash', sa.String(), nullable=False),
+    sa.Column('file_id', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('uploaded_file')
@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, Future
+from threading import Lock
+from typing import Callable, TypeVar, Any, List, Optional, Dict
+
+from loguru import logger
+from pymorphy3.tokenizers import simple_word_tokenize
+
+from .language_processing import Nlp, AnalyzedText, WordRecord
+
+T = TypeVar("T")
+
+_worker_nlp: Optional[Nlp] = None
+
+
+class NlpPool:
+    def __init__(self, nlp: Nlp, max_workers: int, timeout: float):
+        global _worker_nlp
+        _worker_nlp = nlp
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.submitted = 0
+        self.timed_out = 0
+        self._lock = Lock()
+        self._pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("fork"))
+        list(self._pool.map(_ready, range(max_workers)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "timed_out": self.timed_out,
+            }
+
+    def tokenize(self, text: str) -> List[str]:
+        return simple_word_tokenize(text)
+
+    def analyze_text(self, text: str) -> AnalyzedText:
+        try:
+            return self.call(_analyze_text, text)
+        except TimeoutError:
+            logger.warning("nlp analysis timed out after {timeout}s", timeout=self.timeout)
+            return AnalyzedText([], [])
+
+    def inflect(self, word: WordRecord) -> Optional[str]:
+        return word.inflected
+
+    async def parse_many_async(self, texts: List[str]) -> List[AnalyzedText]:
+        return await self.call_async(_parse_many, texts)
+
+    def call(self, func: Callable[..., T], *args: Any) -> T:
+        future = self._submit(func, args)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            self._count_timeout()
+            future.cancel()
+            raise
+
+    async def call_async(self, func: Callable[..., T], *args: Any) -> T:
+        future = asyncio.wrap_future(self._submit(func, args))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._count_timeout()
+            raise
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, func: Callable[..., T], args: tuple) -> Future:
+        with self._lock:
+            self.submitted += 1
+        return self._pool.submit(_call, func, args)
+
+    def _count_timeout(self) -> None:
+        with self._lock:
+            self.timed_out += 1
+
+
+def _ready(_: int) -> bool:
+    return _worker_nlp is not None
+
+
+def _call(func: Callable[..., T], args: tuple) -> T:
+    return func(_worker_nlp, *args)
+
+
+def _analyze_text(nlp: Nlp, text: str) -> AnalyzedText:
+    return nlp.analyze_text(text, inflect=True)
+
+
+def _parse_many(nlp: Nlp, texts: List[str]) -> List[AnalyzedText]:
+    return nlp.parse_many(texts, inflect=True)
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Union, List, Dict, Any, Optional, Callable
+
+from attr import define, field
+from loguru import logger
+from telegram import Update
+
+from .cache import LruCache
+from .language_processing import Nlp, AnalyzedText, WordRecord
+from .nlp_pool import NlpPool
+
+
+@define
+class NlpPrefetcher:
+    nlp: Union[Nlp, NlpPool]
+    min_batch_size: int
+    max_results: int = 1024
+    gate: Optional[Callable[[Update], bool]] = None
+    batches: int = field(init=False, default=0)
+    prefetched: int = field(init=False, default=0)
+    _results: LruCache[str, AnalyzedText] = field(init=False)
+
+    @_results.default
+    def _create_results(self) -> LruCache[str, AnalyzedText]:
+        return LruCache(self.max_results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "prefetched": self.prefetched,
+            "results": len(self._results),
+            "hits": self._results.hits,
+            "misses": self._results.misses,
+        }
+
+    def accepts(self, update: Update) -> bool:
+        return self.gate is None or self.gate(update)
+
+    async def prefetch(self, texts: List[str]) -> None:
+        texts = list(dict.fromkeys(texts))
+        try:
+            if isinstance(self.nlp, NlpPool):
+                analyzed = await self.nlp.parse_many_async(texts)
+            else:
+                analyzed = await asyncio.to_thread(self.nlp.parse_many, texts)
+        except asyncio.TimeoutError:
+            logger.warning("nlp prefetch of {count} messages timed out", count=len(texts))
+            return
+        for text, result in zip(texts, analyzed):
+            self._results.put(text, result)
+        self.batches += 1
+        self.prefetched += len(texts)
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.nlp.tokenize(text)
+
+    def inflect(self, word: WordRecord) -> Optional[str]:
+        return self.nlp.inflect(word)
+
+    def analyze_text(self, text: str) -> AnalyzedText:
+        analyzed = self._results.get(text)
+        return analyzed if analyzed is not None else self.nlp.analyze_text(text)
@@ -0,0 +1,31 @@
+import asyncio
+from contextlib import suppress
+from typing import Callable, Awaitable, Any, Optional
+
+from attr import define, field
+from loguru import logger
+
+
+@define
+class PeriodicTask:
+    name: str
+    interval: float
+    callback: Callable[[], Awaitable[Any]]
+    _task: Optional[asyncio.Task] = field(init=False, default=None)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            with logger.catch(message=f"periodic task {self.name} failed"):
+                await self.callback()
@@ -1,13 +1,16 @@
-from typing import Coroutine, Any, Callable, Optional
+from typing import Coroutine, Any, Callable, Optional, Union
 
 from loguru import logger
 from telegram import Update
 
 from .actions import Action, RestrictMember, CompositeAction
+from .awaitables import resolve
 from .clock import Clock
+from .executor import HandlerExecutor
 from .interpreter import Interpreter
 from .permissions import SecurityFunc, SecurityAction
-from .slowmode_user_repository import SlowmodeUserRepository
+from .send_scheduler import Priority
+from .slowmode_user_repository import SlowmodeUserRepository, AsyncSlowmodeUserRepository
 from .types import HandlerFunc, TContext
 
 PipelineFunc = Callable[[Update, TContext], Coroutine[Any, Any, None]]
@@ -16,26 +19,37 @@ PipelineFunc = Callable[[Update, TContext], Coroutine[Any, Any, None]]
 def pipeline(
         security: SecurityFunc,
         handler: HandlerFunc,
-        interpreter: Interpreter
+        interpreter: Interpreter,
+        priority: int = Priority.NORMAL
 ) -> PipelineFunc:
     async def wrapped(update: Update, context: TContext) -> None:
         with logger.catch():
             if security(update, context) == SecurityAction.DENY:
                 return
-            action = handler(update, context)
+            action = await resolve(handler(update, context))
             if not action:
                 return
-            await interpreter.run_action(action)
+            await interpreter.run_action(action, priority)
     return wrapped
 
 
-def slowmode_support(repository: SlowmodeUserRepository, clock: Clock):
+def blocking(executor: HandlerExecutor):
     def wrapper(handler: HandlerFunc) -> HandlerFunc:
-        def wrapped(update: Update, context: TContext) -> Optional[Action]:
-            result = handler(update, context)
+        async def wrapped(update: Update, context: TContext) -> Optional[Action]:
+            return await resolve(await executor.run(handler, update, context))
+        return wrapped
+    return wrapper
+
+
+def slowmode_support(repository: Union[SlowmodeUserRepository, AsyncSlowmodeUserRepository], clock: Clock):
+    def wrapper(handler: HandlerFunc) -> HandlerFunc:
+        async def wrapped(update: Update, context: TContext) -> Optional[Action]:
+            result = await resolve(handler(update, context))
             if not update.effective_chat or not update.effective_user:
                 return result
-            if restriction := repository.get_active_restriction(update.effective_chat.id, update.effective_user.id):
+            restriction = await resolve(
+                repository.get_active_restriction(update.effective_chat.id, update.effective_user.id))
+            if restriction:
                 return CompositeAction([
                     result,
                     RestrictMember(
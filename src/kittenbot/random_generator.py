@@ -1,5 +1,5 @@
 import random
-from typing import TypeVar, List, Optional
+from typing import TypeVar, Optional, Sequence
 
 from attr import define
 
@@ -14,7 +14,7 @@ class RandomGenerator:
     def get_int(self, min_inclusive: int, max_inclusive: int):
         return random.randint(min_inclusive, max_inclusive)
 
-    def choice(self, items: List[T]) -> Optional[T]:
+    def choice(self, items: Sequence[T]) -> Optional[T]:
         if not items:
             return None
         return random.choice(items)
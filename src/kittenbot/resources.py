@@ -1,12 +1,24 @@
+import argparse
+import hashlib
+import json
+import mimetypes
+from dataclasses import replace
+from collections import defaultdict
 from pathlib import Path
-from typing import Protocol, TypeVar
+from typing import Protocol, TypeVar, Dict, Tuple, Union, Optional, List, Any
 
-from attr import define
+from attr import define, field, asdict
+from loguru import logger
 
+from .actions import FileDocument
+from .cache import ByteBudgetCache
 from .random_generator import RandomGenerator
 
 T = TypeVar("T")
 
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
 
 class Resources(Protocol[T]):
     def get_random_resource(self, directory: str) -> T:
@@ -19,24 +31,190 @@ class Resource(Protocol):
     def get_bytes(self) -> bytes:
         pass
 
+    def get_document(self) -> Union[bytes, FileDocument]:
+        pass
+
 
 @define
 class ProdResource(Resources):
     name: str
-    path: Path
+    document: FileDocument
+    cache: Optional[ByteBudgetCache[FileDocument]] = None
 
     def get_bytes(self) -> bytes:
-        with open(self.path, "rb") as f:
+        document = self.get_document()
+        if document.content is not None:
+            return document.content
+        with document.open() as f:
             return f.read()
 
+    def get_document(self) -> FileDocument:
+        document = self.document
+        if self.cache is None or document.size > self.cache.max_bytes:
+            return document
+        content = self.cache.get(document)
+        if content is None:
+            with document.open() as f:
+                content = f.read()
+            self.cache.put(document, content)
+        return replace(document, content=content)
+
+
+@define(frozen=True)
+class ManifestEntry:
+    category: str
+    filename: str
+    size: int
+    mtime_ns: int
+    mime_type: str
+    sha256: str
+
+
+@define
+class ResourceCatalog:
+    base_dir: Path
+    _categories: Dict[str, Tuple[Path, ...]] = field(init=False, factory=dict)
+    _entries: Dict[Path, ManifestEntry] = field(init=False, factory=dict)
+    _documents: Dict[Path, FileDocument] = field(init=False, factory=dict)
+    _mtimes: Dict[Path, int] = field(init=False, factory=dict)
+
+    def __len__(self) -> int:
+        return sum(len(paths) for paths in self._categories.values())
+
+    def get(self, category: str) -> Tuple[Path, ...]:
+        return self._categories.get(category, ())
+
+    def entry(self, path: Path) -> Optional[ManifestEntry]:
+        return self._entries.get(path)
+
+    def document(self, path: Path) -> FileDocument:
+        return self._documents[path]
+
+    def load(self) -> int:
+        manifest_path = self.base_dir / MANIFEST_NAME
+        if manifest_path.is_file():
+            self._load_manifest(manifest_path)
+            source = manifest_path
+        else:
+            self._scan()
+            source = self.base_dir
+        logger.info("loaded {count} resources from {source}", count=len(self), source=source)
+        return len(self)
+
+    def _load_manifest(self, manifest_path: Path) -> None:
+        mtime = manifest_path.stat().st_mtime_ns
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"unsupported resource manifest version: {manifest.get('version')}")
+        categories = defaultdict(list)
+        entries = {}
+        documents = {}
+        for item in manifest["files"]:
+            entry = ManifestEntry(**item)
+            path = self.base_dir / entry.category / entry.filename
+            categories[entry.category].append(path)
+            entries[path] = entry
+            documents[path] = FileDocument(path, entry.size, entry.mtime_ns, entry.sha256)
+        self._categories = {category: tuple(paths) for category, paths in categories.items()}
+        self._entries = entries
+        self._documents = documents
+        self._mtimes = {manifest_path: mtime}
+
+    def _scan(self) -> None:
+        categories = {}
+        documents = {}
+        mtimes = {self.base_dir: self.base_dir.stat().st_mtime_ns}
+        for category_dir in sorted(self.base_dir.iterdir()):
+            if category_dir.is_dir():
+                categories[category_dir.name] = tuple(sorted(p for p in category_dir.iterdir() if p.is_file()))
+                mtimes[category_dir] = category_dir.stat().st_mtime_ns
+                for path in categories[category_dir.name]:
+                    stat = path.stat()
+                    documents[path] = FileDocument(path, stat.st_size, stat.st_mtime_ns)
+        self._categories = categories
+        self._entries = {}
+        self._documents = documents
+        self._mtimes = mtimes
+
+    def refresh_if_changed(self) -> bool:
+        for path, mtime in self._mtimes.items():
+            try:
+                changed = path.stat().st_mtime_ns != mtime
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                self.load()
+                return True
+        return False
+
 
 @define
 class ProdResources(Resources[ProdResource]):
     random_generator: RandomGenerator
     base_dir: str
+    cache: Optional[ByteBudgetCache[FileDocument]] = None
+    catalog: ResourceCatalog = field(init=False)
+
+    @catalog.default
+    def _load_catalog(self) -> ResourceCatalog:
+        catalog = ResourceCatalog(Path(self.base_dir))
+        catalog.load()
+        return catalog
 
     def get_random_resource(self, directory: str) -> ProdResource:
-        resources_path = Path(self.base_dir, directory)
-        all_resources = list(resources_path.glob("*"))
-        selected_resource = self.random_generator.choice(all_resources)
-        return ProdResource(selected_resource.name, selected_resource)
+        selected_resource = self.random_generator.choice(self.catalog.get(directory))
+        return ProdResource(selected_resource.name, self.catalog.document(selected_resource), self.cache)
+
+
+def build_manifest(base_dir: Path) -> Dict[str, Any]:
+    files: List[ManifestEntry] = []
+    for category_dir in sorted(p for p in base_dir.iterdir() if p.is_dir()):
+        for path in sorted(p for p in category_dir.iterdir() if p.is_file()):
+            stat = path.stat()
+            with open(path, "rb") as f:
+                sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+            files.append(ManifestEntry(
+                category=category_dir.name,
+                filename=path.name,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                mime_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                sha256=sha256
+            ))
+
+    by_hash = defaultdict(list)
+    for entry in files:
+        by_hash[entry.sha256].append(f"{entry.category}/{entry.filename}")
+    duplicates = [paths for paths in by_hash.values() if len(paths) > 1]
+    return {
+        "version": MANIFEST_VERSION,
+        "files": [asdict(entry) for entry in files],
+        "duplicates": duplicates,
+    }
+
+
+def write_manifest(base_dir: Path, output: Path) -> Dict[str, Any]:
+    manifest = build_manifest(base_dir)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    for paths in manifest["duplicates"]:
+        logger.warning("duplicate resources: {paths}", paths=", ".join(paths))
+    logger.info("wrote {count} resources to {output}", count=len(manifest["files"]), output=output)
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m kittenbot.resources")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build-manifest", help="index resource files into a manifest")
+    build_parser.add_argument("base_dir", nargs="?", default="resources", type=Path)
+    build_parser.add_argument("-o", "--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if args.command == "build-manifest":
+        write_manifest(args.base_dir, args.output or args.base_dir / MANIFEST_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from attr import define, field
+
+from .cache import LruCache
+from .clock import Clock
+
+
+@define
+class RestrictionCoalescer:
+    clock: Clock
+    max_size: int = 10000
+    coalesced: int = field(init=False, default=0)
+    _applied: LruCache[Tuple[int, int], datetime] = field(init=False)
+
+    @_applied.default
+    def _create_applied(self) -> LruCache[Tuple[int, int], datetime]:
+        return LruCache(self.max_size)
+
+    def __len__(self) -> int:
+        return len(self._applied)
+
+    def try_acquire(self, chat_id: int, user_id: int, until_date: Optional[datetime]) -> bool:
+        applied_until = self._applied.get((chat_id, user_id))
+        if applied_until is not None and applied_until > self.clock.now():
+            self.coalesced += 1
+            return False
+        if until_date is None:
+            self._applied.pop((chat_id, user_id))
+        else:
+            self._applied.put((chat_id, user_id), until_date)
+        return True
+
+    def release(self, chat_id: int, user_id: int) -> None:
+        self._applied.pop((chat_id, user_id))
@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import suppress
+from datetime import timedelta
+from enum import IntEnum
+from typing import Callable, Awaitable, TypeVar, Dict, List, Optional, Union, Set
+
+from attr import define, field
+from loguru import logger
+from telegram.error import RetryAfter
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+@define
+class TokenBucket:
+    rate: float
+    capacity: float
+    _tokens: float = field(init=False)
+    _updated_at: Optional[float] = field(init=False, default=None)
+
+    @_tokens.default
+    def _initial_tokens(self) -> float:
+        return self.capacity
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        return 0. if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self._tokens -= 1
+
+    def _refill(self, now: float) -> None:
+        if self._updated_at is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+@define
+class ChatWaitStats:
+    dispatched: int = 0
+    total_wait: float = 0.
+    max_wait: float = 0.
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.dispatched if self.dispatched else 0.
+
+
+@define
+class SendSchedulerStats:
+    queue_depth: int
+    in_flight: int
+    sent: int
+    retried: int
+    failed: int
+    average_wait: float
+    max_wait: float
+    throttled_chats: int
+    slowest_chat_id: Optional[int]
+    slowest_chat_average_wait: float
+
+
+@define(order=True)
+class _Job:
+    priority: int
+    sequence: int
+    chat_id: int = field(order=False)
+    call: Callable[[], Awaitable] = field(order=False)
+    future: asyncio.Future = field(order=False)
+    submitted_at: float = field(order=False)
+    attempts: int = field(order=False, default=0)
+
+
+@define
+class SendScheduler:
+    global_rate: float
+    chat_rate: float
+    chat_burst: float = 1.
+    max_retries: int = 3
+    _global_bucket: TokenBucket = field(init=False)
+    _chat_buckets: Dict[int, TokenBucket] = field(init=False, factory=dict)
+    _blocked_until: Dict[int, float] = field(init=False, factory=dict)
+    _queue: List[_Job] = field(init=False, factory=list)
+    _sequence: itertools.count = field(init=False, factory=itertools.count)
+    _wakeup: asyncio.Event = field(init=False, factory=asyncio.Event)
+    _in_flight: Set[asyncio.Task] = field(init=False, factory=set)
+    _chat_waits: Dict[int, ChatWaitStats] = field(init=False, factory=dict)
+    _dispatched: int = field(init=False, default=0)
+    _sent: int = field(init=False, default=0)
+    _retried: int = field(init=False, default=0)
+    _failed: int = field(init=False, default=0)
+    _total_wait: float = field(init=False, default=0.)
+    _max_wait: float = field(init=False, default=0.)
+    _task: Optional[asyncio.Task] = field(init=False, default=None)
+
+    @_global_bucket.default
+    def _create_global_bucket(self) -> TokenBucket:
+        return TokenBucket(self.global_rate, self.global_rate)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def chat_wait(self, chat_id: int) -> ChatWaitStats:
+        return self._chat_waits.get(chat_id, ChatWaitStats())
+
+    def stats(self) -> SendSchedulerStats:
+        now = asyncio.get_running_loop().time()
+        slowest_chat_id, slowest = max(
+            self._chat_waits.items(),
+            key=lambda item: item[1].average_wait,
+            default=(None, ChatWaitStats()))
+        return SendSchedulerStats(
+            self.queue_depth,
+            len(self._in_flight),
+            self._sent,
+            self._retried,
+            self._failed,
+            self._total_wait / self._dispatched if self._dispatched else 0.,
+            self._max_wait,
+            sum(1 for blocked_until in self._blocked_until.values() if blocked_until > now),
+            slowest_chat_id,
+            slowest.average_wait,
+        )
+
+    async def submit(self, chat_id: int, call: Callable[[], Awaitable[T]], priority: int = Priority.NORMAL) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, _Job(priority, next(self._sequence), chat_id, call, future, loop.time()))
+        self._wakeup.set()
+        return await future
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="send_scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for job in self._queue:
+            job.future.cancel()
+        self._queue.clear()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch_ready(loop.time())
+            if delay == 0.:
+                continue
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+
+    def _dispatch_ready(self, now: float) -> Optional[float]:
+        global_delay = self._global_bucket.delay(now)
+        if global_delay > 0.:
+            return global_delay if self._queue else None
+
+        skipped = []
+        delay = None
+        dispatched = False
+        while self._queue:
+            job = heapq.heappop(self._queue)
+            if job.future.done():
+                continue
+            chat_delay = self._chat_delay(job.chat_id, now)
+            if chat_delay > 0.:
+                skipped.append(job)
+                delay = chat_delay if delay is None else min(delay, chat_delay)
+                continue
+            self._dispatch(job, now)
+            dispatched = True
+            break
+        for job in skipped:
+            heapq.heappush(self._queue, job)
+        return 0. if dispatched else delay
+
+    def _chat_delay(self, chat_id: int, now: float) -> float:
+        blocked_until = self._blocked_until.get(chat_id)
+        if blocked_until is not None:
+            if blocked_until > now:
+                return blocked_until - now
+            del self._blocked_until[chat_id]
+        bucket = self._chat_buckets.get(chat_id)
+        return bucket.delay(now) if bucket is not None else 0.
+
+    def _dispatch(self, job: _Job, now: float) -> None:
+        self._global_bucket.take(now)
+        bucket = self._chat_buckets.get(job.chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[job.chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        bucket.take(now)
+        if job.attempts == 0:
+            self._record_wait(job.chat_id, now - job.submitted_at)
+        task = asyncio.create_task(self._send(job))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, job: _Job) -> None:
+        try:
+            result = await job.call()
+        except RetryAfter as e:
+            job.attempts += 1
+            if job.attempts > self.max_retries:
+                self._fail(job, e)
+                return
+            retry_after = _to_seconds(e.retry_after)
+            logger.warning(
+                "flood control in chat {chat_id}, retrying in {retry_after}s",
+                chat_id=job.chat_id,
+                retry_after=retry_after)
+            self._retried += 1
+            loop = asyncio.get_running_loop()
+            self._blocked_until[job.chat_id] = max(
+                self._blocked_until.get(job.chat_id, 0.), loop.time() + retry_after)
+            heapq.heappush(self._queue, job)
+            self._wakeup.set()
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self._sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _fail(self, job: _Job, error: Exception) -> None:
+        self._failed += 1
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _record_wait(self, chat_id: int, wait: float) -> None:
+        chat_stats = self._chat_waits.setdefault(chat_id, ChatWaitStats())
+        chat_stats.dispatched += 1
+        chat_stats.total_wait += wait
+        chat_stats.max_wait = max(chat_stats.max_wait, wait)
+        self._dispatched += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+
+
+def _to_seconds(retry_after: Union[int, float, timedelta]) -> float:
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
@@ -1,8 +1,11 @@
+import heapq
 from datetime import datetime, timedelta
-from typing import Optional
+from threading import Lock
+from typing import Optional, Dict, Tuple, List, Iterable
 
-from attr import define
-from sqlalchemy import Engine, select, delete, update
+from attr import define, field
+from sqlalchemy import Engine, select, delete, update, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.orm import Session
 
 from kittenbot.clock import Clock
@@ -10,25 +13,104 @@ from kittenbot.entities import SlowmodeUser
 
 
 @define
-class SlowmodeUserRepository:
-    engine: Engine
+class RestrictionIndex:
+    _restrictions: Dict[Tuple[int, int], SlowmodeUser] = field(init=False, factory=dict)
+    _expirations: List[Tuple[datetime, int, int]] = field(init=False, factory=list)
+    _lock: Lock = field(init=False, factory=Lock)
+
+    def __len__(self) -> int:
+        return len(self._restrictions)
+
+    def load(self, restrictions: Iterable[SlowmodeUser]) -> None:
+        with self._lock:
+            self._restrictions.clear()
+            self._expirations.clear()
+            for restriction in restrictions:
+                self._put(restriction)
+
+    def put(self, restriction: SlowmodeUser) -> None:
+        with self._lock:
+            self._put(restriction)
+
+    def remove(self, chat_id: int, user_id: int) -> None:
+        with self._lock:
+            self._restrictions.pop((chat_id, user_id), None)
+
+    def get_active(self, chat_id: int, user_id: int, now: datetime) -> Optional[SlowmodeUser]:
+        with self._lock:
+            self._evict_expired(now)
+            return self._restrictions.get((chat_id, user_id))
+
+    def evict_expired(self, now: datetime) -> int:
+        with self._lock:
+            return self._evict_expired(now)
+
+    def _put(self, restriction: SlowmodeUser) -> None:
+        self._restrictions[(restriction.chat_id, restriction.user_id)] = restriction
+        if restriction.until_date is not None:
+            heapq.heappush(self._expirations, (restriction.until_date, restriction.chat_id, restriction.user_id))
+
+    def _evict_expired(self, now: datetime) -> int:
+        evicted = 0
+        while self._expirations and self._expirations[0][0] <= now:
+            until_date, chat_id, user_id = heapq.heappop(self._expirations)
+            restriction = self._restrictions.get((chat_id, user_id))
+            if restriction is not None and restriction.until_date == until_date:
+                del self._restrictions[(chat_id, user_id)]
+                evicted += 1
+        return evicted
+
+
+class _SlowmodeUserQueries:
     clock: Clock
+    index: Optional[RestrictionIndex]
 
-    def get_active_restriction(self, chat_id: int, user_id: int) -> Optional[SlowmodeUser]:
+    def _select_active_restrictions(self, session: Session) -> List[SlowmodeUser]:
         statement = select(SlowmodeUser).where(
-            SlowmodeUser.user_id == user_id
-            and SlowmodeUser.chat_id == chat_id
-            and SlowmodeUser.until_date > self.clock.now()
+            or_(SlowmodeUser.until_date.is_(None), SlowmodeUser.until_date > self.clock.now())
         )
-        with Session(self.engine) as session:
-            return session.execute(statement).scalar()
+        return list(session.execute(statement).scalars())
 
-    def create_restriction(
+    def _delete_expired_restrictions(self, session: Session, now: datetime, limit: int) -> int:
+        expired = session.execute(
+            select(SlowmodeUser.user_id, SlowmodeUser.chat_id)
+            .where(SlowmodeUser.until_date <= now)
+            .limit(limit)
+        ).tuples().all()
+        if expired:
+            session.execute(
+                delete(SlowmodeUser)
+                .where(tuple_(SlowmodeUser.user_id, SlowmodeUser.chat_id).in_(expired))
+            )
+        return len(expired)
+
+    def _index_restriction(self, restriction: Optional[SlowmodeUser]) -> None:
+        if self.index is not None and restriction is not None:
+            self.index.put(restriction)
+
+    def _unindex_restriction(self, chat_id: int, user_id: int) -> None:
+        if self.index is not None:
+            self.index.remove(chat_id, user_id)
+
+    def _unindex_expired(self, now: datetime) -> None:
+        if self.index is not None:
+            self.index.evict_expired(now)
+
+    def _select_active_restriction(self, session: Session, chat_id: int, user_id: int) -> Optional[SlowmodeUser]:
+        statement = select(SlowmodeUser).where(
+            SlowmodeUser.user_id == user_id,
+            SlowmodeUser.chat_id == chat_id,
+            or_(SlowmodeUser.until_date.is_(None), SlowmodeUser.until_date > self.clock.now())
+        )
+        return session.execute(statement).scalar()
+
+    def _insert_restriction(
             self,
+            session: Session,
             chat_id: int,
             user_id: int,
             interval: timedelta,
-            until_date: Optional[datetime] = None
+            until_date: Optional[datetime]
     ) -> SlowmodeUser:
         restriction = SlowmodeUser(
             user_id=user_id,
@@ -36,26 +118,134 @@ class SlowmodeUserRepository:
             interval=interval,
             until_date=until_date
         )
+        session.add(restriction)
+        return restriction
+
+    def _delete_restriction(self, session: Session, chat_id: int, user_id: int) -> None:
+        statement = delete(SlowmodeUser).where(
+            SlowmodeUser.chat_id == chat_id,
+            SlowmodeUser.user_id == user_id
+        )
+        session.execute(statement)
+
+    def _update_restriction(
+            self,
+            session: Session,
+            chat_id: int,
+            user_id: int,
+            interval: timedelta
+    ) -> Optional[SlowmodeUser]:
+        statement = update(SlowmodeUser).where(
+            SlowmodeUser.chat_id == chat_id,
+            SlowmodeUser.user_id == user_id
+        ).values(interval=interval)
+        session.execute(statement)
+        return session.get(SlowmodeUser, (user_id, chat_id), populate_existing=True)
+
+
+@define
+class SlowmodeUserRepository(_SlowmodeUserQueries):
+    engine: Engine
+    clock: Clock
+    index: Optional[RestrictionIndex] = None
+
+    def load_active_restrictions(self) -> int:
+        with Session(self.engine, expire_on_commit=False) as session:
+            restrictions = self._select_active_restrictions(session)
+        if self.index is not None:
+            self.index.load(restrictions)
+        return len(restrictions)
+
+    def get_active_restriction(self, chat_id: int, user_id: int) -> Optional[SlowmodeUser]:
+        if self.index is not None:
+            return self.index.get_active(chat_id, user_id, self.clock.now())
+        with Session(self.engine) as session:
+            return self._select_active_restriction(session, chat_id, user_id)
+
+    def create_restriction(
+            self,
+            chat_id: int,
+            user_id: int,
+            interval: timedelta,
+            until_date: Optional[datetime] = None
+    ) -> SlowmodeUser:
         with Session(self.engine, expire_on_commit=False) as session:
-            session.add(restriction)
+            restriction = self._insert_restriction(session, chat_id, user_id, interval, until_date)
             session.commit()
+        self._index_restriction(restriction)
         return restriction
 
     def delete_restriction(self, chat_id: int, user_id: int) -> None:
-        statement = delete(SlowmodeUser).where(
-            SlowmodeUser.chat_id == chat_id
-            and SlowmodeUser.user_id == user_id
-        )
         with Session(self.engine) as session:
-            session.execute(statement)
+            self._delete_restriction(session, chat_id, user_id)
             session.commit()
+        self._unindex_restriction(chat_id, user_id)
 
-    def update_restriction(self, chat_id: int, user_id: int, interval: timedelta) -> SlowmodeUser:
-        statement = update(SlowmodeUser).where(
-            SlowmodeUser.chat_id == chat_id
-            and SlowmodeUser.user_id == user_id
-        ).values(interval=interval)
+    def update_restriction(self, chat_id: int, user_id: int, interval: timedelta) -> Optional[SlowmodeUser]:
+        with Session(self.engine, expire_on_commit=False) as session:
+            restriction = self._update_restriction(session, chat_id, user_id, interval)
+            session.commit()
+        self._index_restriction(restriction)
+        return restriction
+
+    def delete_expired_restrictions(self, limit: int) -> int:
+        now = self.clock.now()
         with Session(self.engine) as session:
-            restriction = session.execute(statement).scalar()
+            deleted = self._delete_expired_restrictions(session, now, limit)
             session.commit()
+        self._unindex_expired(now)
+        return deleted
+
+
+@define
+class AsyncSlowmodeUserRepository(_SlowmodeUserQueries):
+    engine: AsyncEngine
+    clock: Clock
+    index: Optional[RestrictionIndex] = None
+
+    async def load_active_restrictions(self) -> int:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            restrictions = await session.run_sync(self._select_active_restrictions)
+        if self.index is not None:
+            self.index.load(restrictions)
+        return len(restrictions)
+
+    async def get_active_restriction(self, chat_id: int, user_id: int) -> Optional[SlowmodeUser]:
+        if self.index is not None:
+            return self.index.get_active(chat_id, user_id, self.clock.now())
+        async with AsyncSession(self.engine) as session:
+            return await session.run_sync(self._select_active_restriction, chat_id, user_id)
+
+    async def create_restriction(
+            self,
+            chat_id: int,
+            user_id: int,
+            interval: timedelta,
+            until_date: Optional[datetime] = None
+    ) -> SlowmodeUser:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            restriction = await session.run_sync(self._insert_restriction, chat_id, user_id, interval, until_date)
+            await session.commit()
+        self._index_restriction(restriction)
         return restriction
+
+    async def delete_restriction(self, chat_id: int, user_id: int) -> None:
+        async with AsyncSession(self.engine) as session:
+            await session.run_sync(self._delete_restriction, chat_id, user_id)
+            await session.commit()
+        self._unindex_restriction(chat_id, user_id)
+
+    async def update_restriction(self, chat_id: int, user_id: int, interval: timedelta) -> Optional[SlowmodeUser]:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            restriction = await session.run_sync(self._update_restriction, chat_id, user_id, interval)
+            await session.commit()
+        self._index_restriction(restriction)
+        return restriction
+
+    async def delete_expired_restrictions(self, limit: int) -> int:
+        now = self.clock.now()
+        async with AsyncSession(self.engine) as session:
+            deleted = await session.run_sync(self._delete_expired_restrictions, now, limit)
+            await session.commit()
+        self._unindex_expired(now)
+        return deleted
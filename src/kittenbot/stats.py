@@ -0,0 +1,23 @@
+from typing import Callable, Dict, Any
+
+import attr
+from attr import define, field
+
+StatsProvider = Callable[[], Any]
+
+
+@define
+class StatsRegistry:
+    _providers: Dict[str, StatsProvider] = field(factory=dict)
+
+    def register(self, name: str, provider: StatsProvider) -> None:
+        self._providers[name] = provider
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        return {name: _to_dict(provider()) for name, provider in self._providers.items()}
+
+
+def _to_dict(stats: Any) -> Dict[str, Any]:
+    if attr.has(type(stats)):
+        return attr.asdict(stats)
+    return dict(stats)
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Union
+
+from attr import define, field
+from loguru import logger
+
+from .awaitables import call_repo
+
+from .slowmode_user_repository import SlowmodeUserRepository, AsyncSlowmodeUserRepository
+
+
+@define
+class RestrictionSweeper:
+    repository: Union[SlowmodeUserRepository, AsyncSlowmodeUserRepository]
+    batch_size: int
+    last_swept: int = field(init=False, default=0)
+    total_swept: int = field(init=False, default=0)
+
+    async def sweep(self) -> int:
+        swept = 0
+        while True:
+            deleted = await call_repo(self.repository.delete_expired_restrictions, self.batch_size)
+            swept += deleted
+            if deleted < self.batch_size:
+                break
+            await asyncio.sleep(0)
+        self.last_swept = swept
+        self.total_swept += swept
+        logger.info("swept {count} expired slowmode restrictions", count=swept)
+        return swept
@@ -3,6 +3,7 @@ from typing import TypeVar, Callable, Optional
 from telegram import Update
 
 from .actions import Action
+from .awaitables import MaybeAwaitable
 
 TContext = TypeVar("TContext")
-HandlerFunc = Callable[[Update, TContext], Optional[Action]]
+HandlerFunc = Callable[[Update, TContext], MaybeAwaitable[Optional[Action]]]
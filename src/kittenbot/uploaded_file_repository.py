@@ -0,0 +1,89 @@
+from threading import Lock
+from typing import Dict, Optional, List
+
+from attr import define, field
+from sqlalchemy import Engine, select, delete
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from kittenbot.entities import UploadedFile
+
+
+class _UploadedFileQueries:
+    _file_ids: Dict[str, str]
+    _lock: Lock
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def get_file_id(self, content_hash: str) -> Optional[str]:
+        return self._file_ids.get(content_hash)
+
+    def _select_uploaded_files(self, session: Session) -> List[UploadedFile]:
+        return list(session.execute(select(UploadedFile)).scalars())
+
+    def _save_uploaded_file(self, session: Session, content_hash: str, file_id: str) -> None:
+        session.merge(UploadedFile(content_hash=content_hash, file_id=file_id))
+
+    def _delete_uploaded_file(self, session: Session, content_hash: str) -> None:
+        session.execute(delete(UploadedFile).where(UploadedFile.content_hash == content_hash))
+
+    def _index_uploaded_files(self, uploaded_files: List[UploadedFile]) -> None:
+        with self._lock:
+            self._file_ids = {uploaded_file.content_hash: uploaded_file.file_id for uploaded_file in uploaded_files}
+
+    def _index_file_id(self, content_hash: str, file_id: str) -> None:
+        with self._lock:
+            self._file_ids[content_hash] = file_id
+
+    def _unindex_file_id(self, content_hash: str) -> None:
+        with self._lock:
+            self._file_ids.pop(content_hash, None)
+
+
+@define
+class UploadedFileRepository(_UploadedFileQueries):
+    engine: Engine
+    _file_ids: Dict[str, str] = field(init=False, factory=dict)
+    _lock: Lock = field(init=False, factory=Lock)
+
+    def load_file_ids(self) -> int:
+        with Session(self.engine) as session:
+            self._index_uploaded_files(self._select_uploaded_files(session))
+        return len(self)
+
+    def save_file_id(self, content_hash: str, file_id: str) -> None:
+        with Session(self.engine) as session:
+            self._save_uploaded_file(session, content_hash, file_id)
+            session.commit()
+        self._index_file_id(content_hash, file_id)
+
+    def forget_file_id(self, content_hash: str) -> None:
+        self._unindex_file_id(content_hash)
+        with Session(self.engine) as session:
+            self._delete_uploaded_file(session, content_hash)
+            session.commit()
+
+
+@define
+class AsyncUploadedFileRepository(_UploadedFileQueries):
+    engine: AsyncEngine
+    _file_ids: Dict[str, str] = field(init=False, factory=dict)
+    _lock: Lock = field(init=False, factory=Lock)
+
+    async def load_file_ids(self) -> int:
+        async with AsyncSession(self.engine) as session:
+            self._index_uploaded_files(await session.run_sync(self._select_uploaded_files))
+        return len(self)
+
+    async def save_file_id(self, content_hash: str, file_id: str) -> None:
+        async with AsyncSession(self.engine) as session:
+            await session.run_sync(self._save_uploaded_file, content_hash, file_id)
+            await session.commit()
+        self._index_file_id(content_hash, file_id)
+
+    async def forget_file_id(self, content_hash: str) -> None:
+        self._unindex_file_id(content_hash)
+        async with AsyncSession(self.engine) as session:
+            await session.run_sync(self._delete_uploaded_file, content_hash)
+            await session.commit()
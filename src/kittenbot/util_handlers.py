@@ -1,43 +1,62 @@
 import json
-from typing import Optional, Any
+from typing import Optional, Any, List, Set
 
-from pymorphy3 import MorphAnalyzer
 from pymorphy3.tagset import OpencorporaTag
 from pymorphy3.units import DictionaryAnalyzer
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from kittenbot.actions import Action, Reply, TextReplyContent
+from kittenbot.language_processing import Nlp
+from kittenbot.nlp_pool import NlpPool
 from kittenbot.types import HandlerFunc
 
 
-def parse_handler(morph_analyzer: MorphAnalyzer) -> HandlerFunc:
+def parse_handler(nlp: Nlp, nlp_pool: Optional[NlpPool] = None) -> HandlerFunc:
     def _handle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Action]:
         if not update.message or not update.message.text:
             return None
         words = update.message.text.split(" ")[1:]
-        parsed = map(morph_analyzer.parse, words)
-        text = "\n".join([
-            f"{word}: {json.dumps(parse, ensure_ascii=False, indent=4, cls=Encoder)}"
-            for word, parse in zip(words, parsed)
-        ])
-        return Reply(update.message, TextReplyContent(text))
-    return _handle
+        return Reply(update.message, TextReplyContent(format_parses(nlp, words)))
 
+    async def _handle_in_pool(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Action]:
+        if not update.message or not update.message.text:
+            return None
+        words = update.message.text.split(" ")[1:]
+        return Reply(update.message, TextReplyContent(await nlp_pool.call_async(format_parses, words)))
+    return _handle if nlp_pool is None else _handle_in_pool
 
-def inflect_handler(morph_analyzer: MorphAnalyzer) -> HandlerFunc:
+
+def inflect_handler(nlp: Nlp, nlp_pool: Optional[NlpPool] = None) -> HandlerFunc:
     def _handle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Action]:
         if not update.message or not update.message.text:
             return None
         command_args = update.message.text.split(" ")[1:]
-        word = command_args[0]
-        lexemes = set(command_args[1:])
-        parsed = morph_analyzer.parse(word)
-        text = "\n".join([
-            f"{p.inflect(lexemes).word}" for p in parsed
-        ])
+        text = format_inflections(nlp, command_args[0], set(command_args[1:]))
+        return Reply(update.message, TextReplyContent(text))
+
+    async def _handle_in_pool(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Action]:
+        if not update.message or not update.message.text:
+            return None
+        command_args = update.message.text.split(" ")[1:]
+        text = await nlp_pool.call_async(format_inflections, command_args[0], set(command_args[1:]))
         return Reply(update.message, TextReplyContent(text))
-    return _handle
+    return _handle if nlp_pool is None else _handle_in_pool
+
+
+def format_parses(nlp: Nlp, words: List[str]) -> str:
+    parsed = map(nlp.analyzer.parse, words)
+    return "\n".join([
+        f"{word}: {json.dumps(parse, ensure_ascii=False, indent=4, cls=Encoder)}"
+        for word, parse in zip(words, parsed)
+    ])
+
+
+def format_inflections(nlp: Nlp, word: str, lexemes: Set[str]) -> str:
+    parsed = nlp.analyzer.parse(word)
+    return "\n".join([
+        f"{p.inflect(lexemes).word}" for p in parsed
+    ])
 
 
 class Encoder(json.JSONEncoder):
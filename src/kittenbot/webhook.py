@@ -0,0 +1,34 @@
+from typing import Dict, Any
+
+from telegram.ext import Application
+
+from .config import BotConfig
+
+POLLING = "polling"
+WEBHOOK = "webhook"
+
+
+def validate_update_mode(config: BotConfig) -> None:
+    if config.update_mode not in (POLLING, WEBHOOK):
+        raise ValueError(f"unknown update mode: {config.update_mode}")
+    if config.update_mode == WEBHOOK and not config.webhook_url:
+        raise ValueError("webhook_url must be set when update_mode is webhook")
+
+
+def webhook_options(config: BotConfig) -> Dict[str, Any]:
+    return {
+        "listen": config.webhook_listen,
+        "port": config.webhook_port,
+        "url_path": config.webhook_path,
+        "webhook_url": config.webhook_url,
+        "secret_token": config.webhook_secret_token,
+        "max_connections": config.webhook_max_connections,
+    }
+
+
+def run_application(app: Application, config: BotConfig) -> None:
+    validate_update_mode(config)
+    if config.update_mode == WEBHOOK:
+        app.run_webhook(**webhook_options(config))
+    else:
+        app.run_polling()
@@ -0,0 +1,20 @@
+import asyncio
+import threading
+
+from kittenbot.awaitables import call_repo
+
+
+def test_call_repo_runs_sync_calls_off_the_loop():
+    async def async_call(value):
+        return threading.get_ident(), value
+
+    def sync_call(value):
+        return threading.get_ident(), value
+
+    async def scenario():
+        return threading.get_ident(), await call_repo(async_call, 1), await call_repo(sync_call, value=2)
+
+    loop_thread, (async_thread, first), (sync_thread, second) = asyncio.run(scenario())
+    assert (first, second) == (1, 2)
+    assert async_thread == loop_thread
+    assert sync_thread != loop_thread
@@ -0,0 +1,22 @@
+import asyncio
+from pathlib import Path
+
+from kittenbot.benchmark import run_benchmark, synthetic_corpus, STAGES
+from kittenbot.config import BotConfig
+
+RESOURCES_DIR = str(Path(__file__).parent.parent / "resources")
+
+
+def test_benchmark_reports_every_stage(tmp_path):
+    updates = synthetic_corpus(50, chats=2, users=5, seed=1)
+    report = asyncio.run(run_benchmark(
+        updates,
+        BotConfig(token="1:benchmark", probability=1.0),
+        RESOURCES_DIR,
+        tmp_path / "benchmark.sqlite",
+        slowed_users=1,
+        flush_batch_size=10
+    ))
+    assert "updates: 50" in report
+    for stage in STAGES:
+        assert f"\n{stage} " in report
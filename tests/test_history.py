@@ -0,0 +1,150 @@
+import asyncio
+
+import sqlalchemy
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from kittenbot import entities
+from kittenbot.history import History, HistoryEntry, MembershipCache, AsyncHistory, UserLookupCache
+from kittenbot.history_writer import BufferedHistoryWriter
+
+
+def make_history(db_path=":memory:") -> History:
+    engine = sqlalchemy.create_engine(f"sqlite:///{db_path}")
+    entities.Base.metadata.create_all(engine, checkfirst=True)
+    return History(engine)
+
+
+def test_store_many():
+    hist = make_history()
+    hist.store_many([HistoryEntry(1, 10, "kitten"), HistoryEntry(2, 10, "kitten"), HistoryEntry(1, 11, None)])
+    hist.store_many([HistoryEntry(1, 10, "kitten")])
+    assert hist.get_user_id("kitten") == [10]
+    assert hist.get_user_name(11) is None
+
+
+def test_writer_flushes_on_stop(tmp_path):
+    hist = make_history(tmp_path / "history.sqlite")
+    writer = BufferedHistoryWriter(hist, flush_interval=60, max_batch_size=100)
+
+    async def scenario():
+        await writer.start()
+        writer.submit(HistoryEntry(1, 10, "kitten"))
+        writer.submit(HistoryEntry(1, 10, "kitten"))
+        assert writer.pending_count == 1
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.pending_count == 0
+    assert hist.get_user_id("kitten") == [10]
+
+
+class SlowHistory(AsyncHistory):
+    def __init__(self):
+        super().__init__(None)
+        self.stored = []
+        self.store_started = asyncio.Event()
+
+    async def store_many(self, entries):
+        self.store_started.set()
+        await asyncio.sleep(0.05)
+        self.stored.extend(entries)
+
+
+def test_stop_waits_for_inflight_flush():
+    hist = SlowHistory()
+    writer = BufferedHistoryWriter(hist, flush_interval=0.01, max_batch_size=100)
+
+    async def scenario():
+        await writer.start()
+        writer.submit(HistoryEntry(1, 10, "kitten"))
+        await hist.store_started.wait()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert hist.stored == [HistoryEntry(1, 10, "kitten")]
+    assert writer.pending_count == 0
+
+def test_writer_keeps_latest_username(tmp_path):
+    hist = make_history(tmp_path / "history.sqlite")
+    writer = BufferedHistoryWriter(hist, flush_interval=60, max_batch_size=100)
+    writer.submit(HistoryEntry(1, 10, "old"))
+    writer.submit(HistoryEntry(2, 10, "old"))
+    writer.submit(HistoryEntry(1, 10, "new"))
+    assert asyncio.run(writer.flush()) == 2
+    assert hist.get_user_name(10) == "new"
+    assert hist.get_user_id("new") == [10]
+
+
+def test_membership_cache_skips_known_entries():
+    hist = make_history()
+    hist.membership_cache = MembershipCache(10)
+    hist.store_many([HistoryEntry(1, 10, "kitten")])
+    hist.store_many([HistoryEntry(1, 10, "kitten"), HistoryEntry(1, 10, "cat")])
+    assert hist.membership_cache.hits == 1
+    assert hist.membership_cache.misses == 2
+
+
+def test_store_refreshes_username():
+    hist = make_history()
+    hist.store_many([HistoryEntry(1, 10, "kitten")])
+    hist.store_many([HistoryEntry(2, 10, "cat")])
+    assert hist.get_user_name(10) == "cat"
+    assert hist.get_user_id("kitten") == []
+
+
+def test_async_history(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'history.sqlite'}")
+    hist = AsyncHistory(engine)
+
+    async def scenario():
+        async with engine.begin() as connection:
+            await connection.run_sync(entities.Base.metadata.create_all)
+        await hist.store_many([HistoryEntry(1, 10, "kitten"), HistoryEntry(2, 10, "kitten")])
+        assert await hist.get_user_id("kitten") == [10]
+        assert await hist.get_user_name(10) == "kitten"
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_lookup_cache_invalidated_on_rename():
+    hist = make_history()
+    hist.lookup_cache = UserLookupCache(10)
+    hist.store_many([HistoryEntry(1, 10, "Kitten")])
+    assert hist.get_user_id("kitten") == [10]
+    assert hist.get_user_name(10) == "Kitten"
+    hist.store_many([HistoryEntry(1, 10, "cat")])
+    assert hist.get_user_id("kitten") == []
+    assert hist.get_user_id("CAT") == [10]
+    assert hist.get_user_name(10) == "cat"
+
+
+class FailingHistory(AsyncHistory):
+    def __init__(self):
+        super().__init__(None)
+        self.writer = None
+        self.stored = []
+
+    async def store_many(self, entries):
+        if not self.stored:
+            self.stored.append(None)
+            self.writer.submit(HistoryEntry(1, 10, "c"))
+            raise RuntimeError("database is locked")
+        self.stored.extend(entries)
+
+
+def test_failed_flush_keeps_newer_submissions_last():
+    hist = FailingHistory()
+    writer = hist.writer = BufferedHistoryWriter(hist, flush_interval=60, max_batch_size=100)
+    writer.submit(HistoryEntry(1, 10, "a"))
+    writer.submit(HistoryEntry(2, 10, "b"))
+
+    async def scenario():
+        try:
+            await writer.flush()
+        except RuntimeError:
+            pass
+        await writer.flush()
+
+    asyncio.run(scenario())
+    assert hist.stored[1:] == [HistoryEntry(2, 10, "b"), HistoryEntry(1, 10, "c")]
@@ -0,0 +1,211 @@
+import asyncio
+import datetime
+import hashlib
+from typing import List, Tuple, Union
+
+import pytest
+import sqlalchemy
+from sqlalchemy.pool import StaticPool
+from telegram import Message, Chat, Document
+from telegram.error import BadRequest
+
+from kittenbot import entities
+from kittenbot.actions import Reply, DocumentReplyContent, FileDocument, CompositeAction, RestrictMember, \
+    SequentialAction, TextReplyContent
+from kittenbot.clock import ProdClock
+from kittenbot.interpreter import Interpreter
+from kittenbot.restriction_coalescer import RestrictionCoalescer
+from kittenbot.uploaded_file_repository import UploadedFileRepository
+
+CHAT = Chat(1, Chat.GROUP)
+
+
+class FakeBot:
+    def __init__(self, rejected_file_ids=(), error="Wrong file identifier/http url specified"):
+        self.rejected_file_ids = set(rejected_file_ids)
+        self.error = error
+        self.sent_documents: List[Tuple[int, Union[str, bytes]]] = []
+        self.uploads = 0
+        self.opened_files = []
+
+    async def send_document(self, chat_id, document, reply_to_message_id, filename=None):
+        if hasattr(document, "read"):
+            self.opened_files.append(document)
+            self.sent_documents.append((chat_id, document.read()))
+        else:
+            self.sent_documents.append((chat_id, document))
+        if isinstance(document, str):
+            if document in self.rejected_file_ids:
+                raise BadRequest(self.error)
+            file_id = document
+        else:
+            self.uploads += 1
+            file_id = f"file-{self.uploads}"
+        return Message(
+            reply_to_message_id + 1,
+            datetime.datetime.now(),
+            CHAT,
+            document=Document(file_id, f"unique-{file_id}"))
+
+
+def _reply(message_id: int, document: Union[bytes, FileDocument] = b"video") -> Reply:
+    return Reply(Message(message_id, datetime.datetime.now(), CHAT), DocumentReplyContent("cat.mp4", document))
+
+
+def _repository() -> UploadedFileRepository:
+    engine = sqlalchemy.create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    entities.Base.metadata.create_all(engine)
+    return UploadedFileRepository(engine)
+
+
+def test_file_id_is_reused():
+    bot = FakeBot()
+    repository = _repository()
+    interpreter = Interpreter(bot, repository)
+
+    async def scenario():
+        await interpreter.run_action(_reply(1))
+        await interpreter.run_action(_reply(2))
+
+    asyncio.run(scenario())
+    assert bot.sent_documents == [(1, b"video"), (1, "file-1")]
+    assert bot.uploads == 1
+
+    reloaded = UploadedFileRepository(repository.engine)
+    assert reloaded.load_file_ids() == 1
+
+
+def test_rejected_file_id_is_uploaded_again():
+    bot = FakeBot(rejected_file_ids={"file-1"})
+    repository = _repository()
+    interpreter = Interpreter(bot, repository)
+
+    async def scenario():
+        await interpreter.run_action(_reply(1))
+        await interpreter.run_action(_reply(2))
+        await interpreter.run_action(_reply(3))
+
+    asyncio.run(scenario())
+    assert bot.sent_documents == [(1, b"video"), (1, "file-1"), (1, b"video"), (1, "file-2")]
+    assert len(repository) == 1
+
+
+def test_other_bad_requests_keep_file_id():
+    bot = FakeBot(rejected_file_ids={"file-1"}, error="Message to be replied not found")
+    repository = _repository()
+    interpreter = Interpreter(bot, repository)
+
+    async def scenario():
+        await interpreter.run_action(_reply(1))
+        with pytest.raises(BadRequest):
+            await interpreter.run_action(_reply(2))
+
+    asyncio.run(scenario())
+    assert bot.sent_documents == [(1, b"video"), (1, "file-1")]
+    assert repository.get_file_id(hashlib.sha256(b"video").hexdigest()) == "file-1"
+
+
+def test_file_document_is_read_off_the_loop(tmp_path):
+    path = tmp_path / "cat.mp4"
+    path.write_bytes(b"video")
+    stat = path.stat()
+    document = FileDocument(path, stat.st_size, stat.st_mtime_ns)
+    bot = FakeBot()
+    interpreter = Interpreter(bot, _repository())
+
+    async def scenario():
+        await interpreter.run_action(_reply(1, document))
+        await interpreter.run_action(_reply(2, b"video"))
+
+    asyncio.run(scenario())
+    assert bot.sent_documents == [(1, b"video"), (1, "file-1")]
+    assert bot.opened_files == []
+
+
+def test_cached_document_keeps_its_hash(tmp_path):
+    document = FileDocument(tmp_path / "missing.mp4", 5, 0, "cat-hash", content=b"video")
+    bot = FakeBot()
+    repository = _repository()
+    interpreter = Interpreter(bot, repository)
+
+    async def scenario():
+        await interpreter.run_action(_reply(1, document))
+        await interpreter.run_action(_reply(2, document))
+
+    asyncio.run(scenario())
+    assert bot.sent_documents == [(1, b"video"), (1, "file-1")]
+    assert repository.get_file_id("cat-hash") == "file-1"
+    assert len(interpreter._content_hashes) == 0
+
+
+class SlowUploadBot:
+    def __init__(self):
+        self.events = []
+
+    async def send_document(self, chat_id, document, reply_to_message_id, filename=None):
+        self.events.append("upload started")
+        await asyncio.sleep(0.05)
+        self.events.append("upload finished")
+
+    async def send_message(self, chat_id, text, reply_to_message_id):
+        raise BadRequest("message to reply not found")
+
+    async def restrict_chat_member(self, chat_id, user_id, permissions, until_date):
+        self.events.append("restricted")
+
+
+def test_composite_parts_run_concurrently():
+    bot = SlowUploadBot()
+    interpreter = Interpreter(bot)
+    asyncio.run(interpreter.run_action(CompositeAction([_reply(1), RestrictMember(1, 2, None)])))
+    assert bot.events == ["upload started", "restricted", "upload finished"]
+
+
+def test_sequential_parts_keep_order():
+    bot = SlowUploadBot()
+    interpreter = Interpreter(bot)
+    asyncio.run(interpreter.run_action(SequentialAction([_reply(1), RestrictMember(1, 2, None)])))
+    assert bot.events == ["upload started", "upload finished", "restricted"]
+
+
+def test_composite_failures_are_collected():
+    bot = SlowUploadBot()
+    interpreter = Interpreter(bot)
+    text_reply = Reply(Message(1, datetime.datetime.now(), CHAT), TextReplyContent("meow"))
+    with pytest.raises(ExceptionGroup) as error:
+        asyncio.run(interpreter.run_action(CompositeAction([text_reply, RestrictMember(1, 2, None)])))
+    assert [type(e) for e in error.value.exceptions] == [BadRequest]
+    assert bot.events == ["restricted"]
+
+
+def test_restrictions_in_force_are_coalesced():
+    bot = SlowUploadBot()
+    clock = ProdClock()
+    interpreter = Interpreter(bot, restrictions=RestrictionCoalescer(clock))
+    now = clock.now()
+
+    async def scenario():
+        await interpreter.run_action(RestrictMember(1, 2, now + datetime.timedelta(minutes=5)))
+        await interpreter.run_action(RestrictMember(1, 2, now + datetime.timedelta(minutes=6)))
+        await interpreter.run_action(RestrictMember(1, 3, now + datetime.timedelta(minutes=5)))
+        await interpreter.run_action(RestrictMember(2, 4, now - datetime.timedelta(minutes=1)))
+        await interpreter.run_action(RestrictMember(2, 4, now + datetime.timedelta(minutes=1)))
+
+    asyncio.run(scenario())
+    assert bot.events == ["restricted"] * 4
+    assert interpreter.restrictions.coalesced == 1
+
+
+def test_uploads_go_through_media_bot():
+    bot = FakeBot()
+    media_bot = FakeBot()
+    interpreter = Interpreter(bot, _repository(), media_bot=media_bot)
+
+    async def scenario():
+        await interpreter.run_action(_reply(1))
+        await interpreter.run_action(_reply(2))
+
+    asyncio.run(scenario())
+    assert media_bot.sent_documents == [(1, b"video")]
+    assert bot.sent_documents == [(1, "file-1")]
@@ -0,0 +1,49 @@
+from pymorphy3 import MorphAnalyzer
+
+from kittenbot.language_processing import Nlp
+
+
+def test_analyze_text_classifies_in_one_pass():
+    analyzer = MorphAnalyzer()
+    nlp = Nlp(analyzer)
+    text = "Кот купил кота, кот рад"
+    analyzed = nlp.analyze_text(text)
+    assert [w.word for w in analyzed.nouns] == ["кот", "кота", "кот"]
+    assert [w.word for w in analyzed.transitive_verbs] == ["купил"]
+    assert analyzed == Nlp(analyzer, 0).analyze_text(text)
+    assert nlp.parse_cache.misses == 5
+    assert nlp.parse_cache.hits == 0
+    assert nlp.parse_word("КОТ") == analyzer.parse("кот")[0]
+
+
+def test_inflections_are_cached():
+    nlp = Nlp(MorphAnalyzer())
+    noun = nlp.parse_word("магазинах")
+    verb = nlp.parse_word("купил")
+    assert nlp.inflect_to_plur(noun).word == "магазины"
+    assert nlp.inflect_to_plur(nlp.parse_word("магазинах")).word == "магазины"
+    imperative = nlp.inflect_to_imperative(verb).word
+    assert nlp.inflect_to_imperative(verb).word == imperative
+    assert (nlp.inflection_cache.hits, nlp.inflection_cache.misses) == (2, 2)
+
+
+def test_parse_many_analyzes_each_word_once():
+    analyzer = MorphAnalyzer()
+    nlp = Nlp(analyzer)
+    texts = ["Кот купил рыбу", "кот купил молоко", "ладно"]
+    analyzed = nlp.parse_many(texts)
+    assert analyzed == [Nlp(analyzer).analyze_text(text) for text in texts]
+    assert [w.word for w in analyzed[1].nouns] == ["кот", "молоко"]
+    assert nlp.parse_cache.misses == 5
+    assert nlp.parse_cache.hits == 0
+
+
+def test_analysis_inflects_lazily():
+    nlp = Nlp(MorphAnalyzer())
+    analyzed = nlp.analyze_text("Кот купил магазины")
+    assert [w.inflected for w in analyzed.nouns + analyzed.transitive_verbs] == [None, None, None]
+    assert nlp.inflection_cache.misses == 0
+    assert nlp.inflect(analyzed.nouns[0]) == "коты"
+    assert nlp.inflection_cache.misses == 1
+    eager = nlp.analyze_text("Кот купил магазины", inflect=True)
+    assert [nlp.inflect(w) for w in analyzed.transitive_verbs] == [w.inflected for w in eager.transitive_verbs]
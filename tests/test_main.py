@@ -0,0 +1,20 @@
+import asyncio
+
+from kittenbot.config import BotConfig
+from kittenbot.main import create_api_request, create_media_request, create_get_updates_request
+
+
+def test_requests_support_http2(monkeypatch):
+    monkeypatch.setenv("token", "1:test")
+    for name in ("api_http_version", "media_http_version", "get_updates_http_version"):
+        monkeypatch.setenv(name, "2")
+    config = BotConfig()
+
+    async def scenario():
+        for create in (create_api_request, create_media_request, create_get_updates_request):
+            request = create(config)
+            await request.initialize()
+            assert request.http_version == "2"
+            await request.shutdown()
+
+    asyncio.run(scenario())
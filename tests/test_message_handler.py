@@ -1,5 +1,7 @@
 from __future__ import annotations
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from string import Template
 from typing import Optional, Union, Any
 
@@ -24,6 +26,9 @@ class TestResource(Resource):
     def get_bytes(self) -> bytes:
         return self.content
 
+    def get_document(self) -> bytes:
+        return self.content
+
 
 class TestResources(Resources[TestResource]):
     def get_random_resource(self, directory: str) -> TestResource:
@@ -115,6 +120,58 @@ def test_stopwords(handler, scenario):
     assert actual == expected
 
 
+def test_no_parsing_without_reaction(handler, monkeypatch):
+    handler.action_probability = 0.0
+
+    def fail(self, text):
+        raise AssertionError("message should not be parsed")
+
+    monkeypatch.setattr(Nlp, "analyze_text", fail)
+    actual = handler.handle(Update(0, make_message("купил сегодня новый велосипед")), None)
+    assert actual is None
+
+
+def test_demo_word_without_reaction(handler):
+    handler.action_probability = 0.0
+    handler.add_demo_word("велосипед")
+    user_message = make_message("купил сегодня новый Велосипед")
+    actual = handler.handle(Update(0, user_message), None)
+    expected = Reply(user_message, TextReplyContent("велосипеды для котиков"))
+    assert actual == expected
+    assert handler.demo_words == []
+
+
+def test_demo_word_is_used_once_across_threads(handler):
+    handler.action_probability = 0.0
+    handler.add_demo_word("велосипед")
+    barrier = threading.Barrier(8)
+
+    def handle(_: int) -> Optional[Action]:
+        barrier.wait()
+        return handler.handle(Update(0, make_message("купил сегодня новый велосипед")), None)
+
+    with ThreadPoolExecutor(8) as executor:
+        replies = [reply for reply in executor.map(handle, range(8)) if reply is not None]
+    assert len(replies) == 1
+    assert handler.demo_words == []
+
+
+def test_gate_roll_is_reused_by_handler(handler):
+    update = Update(0, make_message("купил сегодня новый велосипед"))
+    assert handler.wants_analysis(update)
+    handler.action_probability = 0.0
+    assert handler.handle(update, None) is not None
+    assert handler.handle(update, None) is None
+
+
+def test_gate_skips_messages_without_reaction(handler):
+    handler.action_probability = 0.0
+    assert not handler.wants_analysis(Update(0, make_message("купил сегодня новый велосипед")))
+    assert not handler.wants_analysis(Update(0, make_message("котобот для котиков")))
+    handler.add_demo_word("велосипед")
+    assert handler.wants_analysis(Update(0, make_message("купил сегодня новый велосипед")))
+
+
 def make_message(text: str) -> Message:
     return Message(0, datetime.datetime.now(), Chat(0, "test"), text=text)
 
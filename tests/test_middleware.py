@@ -0,0 +1,169 @@
+import asyncio
+import datetime
+from typing import List, Tuple
+
+from pymorphy3 import MorphAnalyzer
+from telegram import Update, Message, Chat, MessageEntity, User
+
+from kittenbot.entities import SlowmodeUser
+from kittenbot.language_processing import Nlp
+from kittenbot.middleware import ChatOrderedUpdateProcessor
+from kittenbot.nlp_prefetch import NlpPrefetcher
+from kittenbot.slowmode_user_repository import RestrictionIndex
+
+
+def make_update(update_id: int, chat_id: int, text: str = "test") -> Update:
+    return Update(update_id, Message(update_id, datetime.datetime.now(), Chat(chat_id, "group"), text=text))
+
+
+def test_updates_are_ordered_per_chat_and_concurrent_across_chats():
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=4, max_chat_queue_size=8)
+    events: List[Tuple[str, int]] = []
+    slow_chat_released = asyncio.Event()
+
+    async def handle(update: Update) -> None:
+        events.append(("start", update.update_id))
+        if update.effective_chat.id == 1 and update.update_id == 1:
+            await slow_chat_released.wait()
+        await asyncio.sleep(0)
+        events.append(("end", update.update_id))
+
+    async def scenario():
+        updates = [make_update(1, 1), make_update(2, 1), make_update(3, 2)]
+        tasks = [asyncio.create_task(processor.process_update(update, handle(update))) for update in updates]
+        while ("end", 3) not in events:
+            await asyncio.sleep(0)
+        assert ("start", 2) not in events
+        slow_chat_released.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert events.index(("end", 1)) < events.index(("start", 2))
+    assert processor.pending_updates == 0
+
+
+def test_full_chat_queue_drops_updates():
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=1, max_chat_queue_size=1)
+    handled: List[int] = []
+    release = asyncio.Event()
+
+    async def handle(update: Update) -> None:
+        await release.wait()
+        handled.append(update.update_id)
+
+    async def scenario():
+        first = asyncio.create_task(processor.process_update(make_update(1, 1), handle(make_update(1, 1))))
+        await asyncio.sleep(0)
+        await processor.process_update(make_update(2, 1), handle(make_update(2, 1)))
+        release.set()
+        await first
+
+    asyncio.run(scenario())
+    assert handled == [1]
+    assert processor.dropped_updates == 1
+
+
+def test_full_chat_queue_keeps_commands():
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=1, max_chat_queue_size=1)
+    handled: List[int] = []
+    release = asyncio.Event()
+    command = Update(2, Message(2, datetime.datetime.now(), Chat(1, "group"), text="/slow get",
+                                entities=[MessageEntity(MessageEntity.BOT_COMMAND, 0, 5)]))
+
+    async def handle(update: Update) -> None:
+        await release.wait()
+        handled.append(update.update_id)
+
+    async def scenario():
+        first = asyncio.create_task(processor.process_update(make_update(1, 1), handle(make_update(1, 1))))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(processor.process_update(command, handle(command)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert handled == [1, 2]
+    assert processor.dropped_updates == 0
+
+
+def test_full_chat_queue_keeps_slowed_users():
+    index = RestrictionIndex()
+    index.put(SlowmodeUser(user_id=7, chat_id=1, interval=datetime.timedelta(minutes=1), until_date=None))
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=1, max_chat_queue_size=1, restriction_index=index)
+    handled: List[int] = []
+    release = asyncio.Event()
+    slowed = Update(2, Message(2, datetime.datetime.now(), Chat(1, "group"), from_user=User(7, "cat", False),
+                               text="spam"))
+    other = Update(3, Message(3, datetime.datetime.now(), Chat(1, "group"), from_user=User(8, "dog", False),
+                              text="spam"))
+
+    async def handle(update: Update) -> None:
+        await release.wait()
+        handled.append(update.update_id)
+
+    async def scenario():
+        first = asyncio.create_task(processor.process_update(make_update(1, 1), handle(make_update(1, 1))))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(processor.process_update(slowed, handle(slowed)))
+        await asyncio.sleep(0)
+        await processor.process_update(other, handle(other))
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert handled == [1, 2]
+    assert processor.dropped_updates == 1
+
+def test_backlog_is_prefetched_in_one_batch():
+    nlp = Nlp(MorphAnalyzer())
+    prefetcher = NlpPrefetcher(nlp, min_batch_size=3)
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=1, max_chat_queue_size=8, prefetcher=prefetcher)
+    release = asyncio.Event()
+    analyzed = []
+
+    async def handle(update: Update) -> None:
+        if update.update_id == 1:
+            await release.wait()
+        analyzed.append(prefetcher.analyze_text(update.message.text))
+
+    async def scenario():
+        texts = ["кот спит", "кот купил рыбу", "купи рыбу", "кот спит"]
+        updates = [make_update(i, 1, text) for i, text in enumerate(texts, 1)]
+        tasks = [asyncio.create_task(processor.process_update(update, handle(update))) for update in updates]
+        while prefetcher.batches == 0:
+            await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+        await processor.shutdown()
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert analyzed == nlp.parse_many(texts)
+    assert prefetcher.stats()["prefetched"] == 3
+    assert prefetcher.stats()["hits"] == 4
+
+
+def test_gated_messages_are_not_prefetched():
+    nlp = Nlp(MorphAnalyzer())
+    prefetcher = NlpPrefetcher(nlp, min_batch_size=2, gate=lambda update: "кот" in update.message.text)
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=1, max_chat_queue_size=8, prefetcher=prefetcher)
+    release = asyncio.Event()
+
+    async def handle(update: Update) -> None:
+        if update.update_id == 1:
+            await release.wait()
+
+    async def scenario():
+        texts = ["первое", "кот спит", "купи рыбу", "кот купил рыбу"]
+        updates = [make_update(i, 1, text) for i, text in enumerate(texts, 1)]
+        tasks = [asyncio.create_task(processor.process_update(update, handle(update))) for update in updates]
+        while prefetcher.batches == 0:
+            await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+        await processor.shutdown()
+
+    asyncio.run(scenario())
+    assert prefetcher.stats()["prefetched"] == 2
+    assert prefetcher.stats()["results"] == 2
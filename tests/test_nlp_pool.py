@@ -0,0 +1,21 @@
+import asyncio
+
+from pymorphy3 import MorphAnalyzer
+
+from kittenbot.language_processing import Nlp
+from kittenbot.nlp_pool import NlpPool
+from kittenbot.util_handlers import format_inflections
+
+
+def test_pool_matches_local_analysis():
+    nlp = Nlp(MorphAnalyzer())
+    pool = NlpPool(nlp, 2, timeout=10.)
+    try:
+        text = "Кот купил магазины и недобрал рыбы"
+        assert pool.analyze_text(text) == nlp.analyze_text(text, inflect=True)
+        inflected = asyncio.run(pool.call_async(format_inflections, "кот", {"plur"}))
+        assert inflected.splitlines()[0] == "коты"
+        assert asyncio.run(pool.parse_many_async([text, "кот"])) == nlp.parse_many([text, "кот"], inflect=True)
+        assert pool.stats()["submitted"] == 3
+    finally:
+        pool.shutdown()
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+from typing import Any, Optional, List
+
+from telegram import Update
+
+from kittenbot.actions import Action, Reply, TextReplyContent
+from kittenbot.executor import HandlerExecutor
+from kittenbot.permissions import allow_all
+from kittenbot.pipelines import pipeline, blocking
+from kittenbot.send_scheduler import Priority
+
+
+class RecordingInterpreter:
+    def __init__(self):
+        self.actions: List[Action] = []
+
+    async def run_action(self, action: Action, priority: int = Priority.NORMAL) -> None:
+        self.actions.append(action)
+
+
+def test_blocking_handler_runs_in_pool():
+    executor = HandlerExecutor(2)
+    interpreter = RecordingInterpreter()
+    handler_threads = []
+
+    def handler(update: Update, context: Any) -> Optional[Action]:
+        handler_threads.append(threading.current_thread())
+        return Reply(None, TextReplyContent("done"))
+
+    asyncio.run(pipeline(allow_all, blocking(executor)(handler), interpreter)(Update(0), None))
+    executor.shutdown()
+
+    assert interpreter.actions == [Reply(None, TextReplyContent("done"))]
+    assert handler_threads[0] is not threading.main_thread()
+    stats = executor.stats()
+    assert stats.completed == 1 and stats.queue_depth == 0 and stats.running == 0
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+
+from kittenbot.cache import ByteBudgetCache
+from kittenbot.random_generator import RandomGenerator
+from kittenbot.resources import ProdResources, write_manifest, MANIFEST_NAME
+
+
+def test_byte_budget_cache_evicts_least_recently_used():
+    cache = ByteBudgetCache(10)
+    assert cache.put("a", b"1234")
+    assert cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    assert cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.size_bytes == 8 and cache.evictions == 1
+    assert not cache.put("d", b"12345678901")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_resources_are_served_from_cache(tmp_path):
+    (tmp_path / "agree").mkdir()
+    (tmp_path / "agree" / "cat.mp4").write_bytes(b"video")
+    (tmp_path / "izvinis").mkdir()
+    (tmp_path / "izvinis" / "big.mp4").write_bytes(b"x" * 100)
+    cache = ByteBudgetCache(64)
+    resources = ProdResources(RandomGenerator(), str(tmp_path), cache)
+
+    assert resources.get_random_resource("agree").get_document().content == b"video"
+    assert resources.get_random_resource("agree").get_document().content == b"video"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    big = resources.get_random_resource("izvinis")
+    assert big.get_document().content is None
+    assert big.get_bytes() == b"x" * 100
+    assert len(cache) == 1
+
+
+def test_replies_make_no_metadata_calls(tmp_path, monkeypatch):
+    (tmp_path / "agree").mkdir()
+    (tmp_path / "agree" / "cat.mp4").write_bytes(b"video")
+    resources = ProdResources(RandomGenerator(), str(tmp_path))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("resource file was stat-ed on reply")
+
+    monkeypatch.setattr(Path, "stat", fail)
+    document = resources.get_random_resource("agree").get_document()
+    assert (document.path, document.size) == (tmp_path / "agree" / "cat.mp4", 5)
+
+
+def test_manifest_is_used_instead_of_scanning(tmp_path, monkeypatch):
+    (tmp_path / "agree").mkdir()
+    (tmp_path / "agree" / "cat.mp4").write_bytes(b"video")
+    (tmp_path / "izvinis").mkdir()
+    (tmp_path / "izvinis" / "cat.mp4").write_bytes(b"video")
+    manifest = write_manifest(tmp_path, tmp_path / MANIFEST_NAME)
+    assert manifest["duplicates"] == [["agree/cat.mp4", "izvinis/cat.mp4"]]
+    assert manifest["files"][0]["mime_type"] == "video/mp4"
+
+    (tmp_path / "agree" / "unlisted.mp4").write_bytes(b"unlisted")
+    resources = ProdResources(RandomGenerator(), str(tmp_path), ByteBudgetCache(64))
+    assert len(resources.catalog) == 2
+    monkeypatch.setattr(Path, "stat", lambda *args, **kwargs: pytest.fail("resource file was stat-ed"))
+    document = resources.get_random_resource("agree").get_document()
+    assert document.content_hash == manifest["files"][0]["sha256"]
+    assert document.content == b"video"
+    assert (document.size, document.mtime_ns) == (manifest["files"][0]["size"], manifest["files"][0]["mtime_ns"])
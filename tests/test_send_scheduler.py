@@ -0,0 +1,68 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+from kittenbot.send_scheduler import SendScheduler, Priority, TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(2., 2.)
+    bucket.take(0.)
+    bucket.take(0.)
+    assert bucket.delay(0.) == 0.5
+    assert bucket.delay(0.5) == 0.
+
+
+def test_higher_priority_is_sent_first():
+    sent = []
+
+    async def scenario():
+        scheduler = SendScheduler(global_rate=100., chat_rate=100.)
+
+        async def send(label):
+            sent.append(label)
+
+        submitted = [
+            asyncio.create_task(scheduler.submit(1, lambda: send("reaction"), Priority.LOW)),
+            asyncio.create_task(scheduler.submit(2, lambda: send("admin"), Priority.HIGH)),
+        ]
+        await asyncio.sleep(0)
+        await scheduler.start()
+        await asyncio.gather(*submitted)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert sent == ["admin", "reaction"]
+
+
+def test_retry_after_does_not_block_other_chats():
+    sent = []
+    attempts = {"flooded": 0}
+
+    async def scenario():
+        scheduler = SendScheduler(global_rate=100., chat_rate=100.)
+        await scheduler.start()
+
+        async def flooded():
+            attempts["flooded"] += 1
+            if attempts["flooded"] == 1:
+                raise RetryAfter(0.2)
+            sent.append("flooded")
+            return "ok"
+
+        async def other():
+            sent.append("other")
+
+        flooded_send = asyncio.create_task(scheduler.submit(1, flooded))
+        await asyncio.sleep(0.05)
+        await scheduler.submit(2, other)
+        assert sent == ["other"]
+        assert scheduler.stats().throttled_chats == 1
+        assert await flooded_send == "ok"
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert sent == ["other", "flooded"]
+    assert (stats.sent, stats.retried, stats.queue_depth) == (2, 1, 0)
@@ -1,10 +1,17 @@
-from datetime import timedelta
+import asyncio
+from datetime import timedelta, datetime
 
 import sqlalchemy
+from attr import define
+from sqlalchemy.ext.asyncio import create_async_engine
+from telegram import Update, Message, Chat
 
 from kittenbot import entities
-from kittenbot.clock import ProdClock
-from kittenbot.slowmode_user_repository import SlowmodeUserRepository
+from kittenbot.admin_handler import SlowCommandHandler
+from kittenbot.clock import ProdClock, Clock
+from kittenbot.history import History
+from kittenbot.slowmode_user_repository import SlowmodeUserRepository, AsyncSlowmodeUserRepository, RestrictionIndex
+from kittenbot.sweeper import RestrictionSweeper
 
 
 def test():
@@ -14,3 +21,83 @@ def test():
     r1 = repo.create_restriction(1, 1, timedelta(minutes=5))
     r2 = repo.get_active_restriction(1, 1)
     assert r1.user_id == r2.user_id and r1.chat_id == r2.chat_id
+
+
+def test_async(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slowmode.sqlite'}")
+    repo = AsyncSlowmodeUserRepository(engine, ProdClock())
+
+    async def scenario():
+        async with engine.begin() as connection:
+            await connection.run_sync(entities.Base.metadata.create_all)
+        r1 = await repo.create_restriction(1, 1, timedelta(minutes=5))
+        r2 = await repo.get_active_restriction(1, 1)
+        assert r1.user_id == r2.user_id and r1.chat_id == r2.chat_id
+        r3 = await repo.update_restriction(1, 1, timedelta(minutes=10))
+        assert r3.interval == timedelta(minutes=10)
+        await repo.delete_restriction(1, 1)
+        assert await repo.get_active_restriction(1, 1) is None
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+@define
+class FakeClock(Clock):
+    current: datetime
+
+    def now(self) -> datetime:
+        return self.current
+
+
+def test_index():
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    entities.SlowmodeUser.metadata.create_all(engine, checkfirst=True)
+    clock = FakeClock(datetime(2024, 1, 1))
+    SlowmodeUserRepository(engine, clock).create_restriction(1, 1, timedelta(minutes=5))
+    SlowmodeUserRepository(engine, clock).create_restriction(1, 2, timedelta(minutes=5), clock.now() - timedelta(minutes=1))
+    repo = SlowmodeUserRepository(engine, clock, RestrictionIndex())
+    assert repo.load_active_restrictions() == 1
+    assert repo.get_active_restriction(1, 1).interval == timedelta(minutes=5)
+    assert repo.get_active_restriction(1, 2) is None
+    repo.create_restriction(1, 3, timedelta(minutes=1), clock.now() + timedelta(minutes=1))
+    assert repo.get_active_restriction(1, 3) is not None
+    clock.current += timedelta(minutes=1)
+    assert repo.get_active_restriction(1, 3) is None
+    repo.update_restriction(1, 1, timedelta(minutes=10))
+    assert repo.get_active_restriction(1, 1).interval == timedelta(minutes=10)
+    repo.delete_restriction(1, 1)
+    assert repo.get_active_restriction(1, 1) is None
+
+
+def test_sweeper(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'slowmode.sqlite'}")
+    entities.SlowmodeUser.metadata.create_all(engine, checkfirst=True)
+    clock = ProdClock()
+    repo = SlowmodeUserRepository(engine, clock, RestrictionIndex())
+    for user_id in range(5):
+        repo.create_restriction(1, user_id, timedelta(minutes=1), clock.now() - timedelta(minutes=1))
+    repo.create_restriction(1, 10, timedelta(minutes=1))
+    sweeper = RestrictionSweeper(repo, batch_size=2)
+    assert asyncio.run(sweeper.sweep()) == 5
+    assert repo.load_active_restrictions() == 1
+    assert asyncio.run(sweeper.sweep()) == 0
+
+
+def test_slow_command_uses_int_ids(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'slowmode.sqlite'}")
+    entities.Base.metadata.create_all(engine, checkfirst=True)
+    clock = ProdClock()
+    repo = SlowmodeUserRepository(engine, clock, RestrictionIndex())
+    handler = SlowCommandHandler(repo, History(engine), clock)
+
+    def slow(args: str) -> str:
+        message = Message(1, clock.now(), Chat(-100, "group"), text=f"/slow {args}")
+        return asyncio.run(handler(Update(1, message), None)).content.text
+
+    slow("create chat_id=-100 user_id=42 interval=1m")
+    assert repo.get_active_restriction(-100, 42).interval == timedelta(minutes=1)
+    assert "is slowed" in slow("get chat_id=-100 user_id=42")
+    slow("delete chat_id=-100 user_id=42")
+    assert repo.get_active_restriction(-100, 42) is None
+    assert "not slowed" in slow("get chat_id=-100 user_id=42")
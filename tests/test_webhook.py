@@ -0,0 +1,117 @@
+import asyncio
+import json
+import socket
+import time
+from typing import Optional, Tuple, List, Dict, Any
+
+import httpx
+import pytest
+from telegram.ext import ApplicationBuilder, CommandHandler
+from telegram.request import BaseRequest, RequestData
+
+from kittenbot.config import BotConfig
+from kittenbot.interpreter import Interpreter
+from kittenbot.permissions import allow_all
+from kittenbot.ping_handler import ping
+from kittenbot.pipelines import pipeline
+from kittenbot.webhook import webhook_options, validate_update_mode
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "kittenbot", "username": "kittenbot"}
+CHAT = {"id": 42, "type": "group", "title": "cats"}
+SECRET = "meow"
+
+
+class FakeTelegramApi(BaseRequest):
+    def __init__(self):
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.message_sent = asyncio.Event()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        self.calls.append((endpoint, parameters))
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint == "sendMessage":
+            result = {"message_id": 2, "date": int(time.time()), "chat": CHAT, "from": BOT_USER,
+                      "text": parameters["text"]}
+            self.message_sent.set()
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _ping_update(update_id: int) -> Dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": CHAT,
+            "from": {"id": 7, "is_bot": False, "first_name": "cat"},
+            "text": "/ping",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+
+
+def test_webhook_delivers_updates_to_pipeline(monkeypatch):
+    port = _free_port()
+    monkeypatch.setenv("token", "1:test")
+    monkeypatch.setenv("webhook_listen", "127.0.0.1")
+    monkeypatch.setenv("webhook_port", str(port))
+    monkeypatch.setenv("webhook_path", "telegram")
+    monkeypatch.setenv("webhook_secret_token", SECRET)
+    config = BotConfig()
+    api = FakeTelegramApi()
+
+    async def scenario() -> float:
+        app = ApplicationBuilder().token(config.token).request(api).get_updates_request(api).build()
+        app.add_handler(CommandHandler("ping", pipeline(allow_all, ping, Interpreter(app.bot))))
+        async with app:
+            await app.updater.start_webhook(**webhook_options(config))
+            await app.start()
+            try:
+                async with httpx.AsyncClient() as client:
+                    url = f"http://127.0.0.1:{port}/telegram"
+                    rejected = await client.post(
+                        url, json=_ping_update(1), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+                    assert rejected.status_code == 403
+
+                    started = time.perf_counter()
+                    response = await client.post(
+                        url, json=_ping_update(2), headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                    assert response.status_code == 200
+                    await asyncio.wait_for(api.message_sent.wait(), 5)
+                    return time.perf_counter() - started
+            finally:
+                await app.updater.stop()
+                await app.stop()
+
+    latency = asyncio.run(scenario())
+    assert latency < 5
+    sent = [parameters for endpoint, parameters in api.calls if endpoint == "sendMessage"]
+    assert [(parameters["chat_id"], parameters["text"]) for parameters in sent] == [(42, "pong")]
+    assert any(endpoint == "setWebhook" for endpoint, _ in api.calls)
+
+
+def test_webhook_mode_requires_url(monkeypatch):
+    monkeypatch.setenv("token", "1:test")
+    monkeypatch.setenv("update_mode", "webhook")
+    with pytest.raises(ValueError, match="webhook_url"):
+        validate_update_mode(BotConfig())
+    monkeypatch.setenv("webhook_url", "https://example.com/telegram")
+    validate_update_mode(BotConfig())